@@ -0,0 +1,115 @@
+"""
+Compare OCR backends on a set of images.
+
+    python benchmark_ocr.py [IMAGE_DIR] [--runs N] [--backends pytesseract,tesserocr]
+
+Without IMAGE_DIR a handful of synthetic text images are generated. Each
+backend is created once and then fed every image ``runs`` times, which is
+what a long-lived processing-pool worker sees.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.document_processor import PytesseractBackend, TesserocrBackend
+
+BACKENDS = {
+    "pytesseract": PytesseractBackend,
+    "tesserocr": TesserocrBackend,
+}
+
+
+def synthetic_images(count: int = 10):
+    images = []
+    for index in range(count):
+        image = Image.new("L", (1200, 400), color=255)
+        draw = ImageDraw.Draw(image)
+        for line in range(6):
+            draw.text((40, 40 + line * 55), f"Incident {index} line {line}: pump seal leak at unit {line * 7}", fill=0)
+        images.append(image)
+    return images
+
+
+def load_images(directory: str):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        try:
+            with open(path, "rb") as f:
+                image = Image.open(io.BytesIO(f.read()))
+                image.load()
+            images.append(image)
+        except Exception:
+            continue
+    return images
+
+
+def benchmark(backend_name: str, images, runs: int, lang: str, psm: int):
+    started = time.perf_counter()
+    backend = BACKENDS[backend_name](lang, psm)
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    chars = 0
+    for _ in range(runs):
+        for image in images:
+            call_started = time.perf_counter()
+            chars += len(backend.image_to_string(image).strip())
+            timings.append((time.perf_counter() - call_started) * 1000)
+
+    timings.sort()
+    return {
+        "backend": backend_name,
+        "images": len(timings),
+        "startup_ms": round(startup_ms, 2),
+        "total_ms": round(sum(timings), 2),
+        "mean_ms": round(statistics.mean(timings), 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+        "chars": chars,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("image_dir", nargs="?")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--backends", default="pytesseract,tesserocr")
+    parser.add_argument("--lang", default=os.getenv("OCR_LANG", "eng"))
+    parser.add_argument("--psm", type=int, default=int(os.getenv("OCR_PSM", 3)))
+    args = parser.parse_args()
+
+    images = load_images(args.image_dir) if args.image_dir else synthetic_images()
+    if not images:
+        print("No readable images found")
+        return 1
+
+    print(f"{len(images)} images x {args.runs} runs, lang={args.lang} psm={args.psm}\n")
+    print(f"{'backend':<12} {'startup ms':>11} {'total ms':>10} {'mean ms':>9} {'p95 ms':>9} {'chars':>8}")
+
+    results = []
+    for name in args.backends.split(","):
+        try:
+            result = benchmark(name.strip(), images, args.runs, args.lang, args.psm)
+        except Exception as e:
+            print(f"{name:<12} unavailable: {e}")
+            continue
+        results.append(result)
+        print(
+            f"{result['backend']:<12} {result['startup_ms']:>11} {result['total_ms']:>10} "
+            f"{result['mean_ms']:>9} {result['p95_ms']:>9} {result['chars']:>8}"
+        )
+
+    if len(results) == 2 and results[1]["total_ms"]:
+        print(f"\n{results[1]['backend']} speedup: {results[0]['total_ms'] / results[1]['total_ms']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
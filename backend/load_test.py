@@ -0,0 +1,111 @@
+"""
+Load test the analysis and report endpoints of a running API.
+
+Start the API against the fake LLM backend so no model API is called:
+
+    LLM_BACKEND=fake LLM_FAKE_LATENCY_MS=800 python main.py
+
+then, in another shell:
+
+    python load_test.py --incident-ids ID1,ID2 --endpoint first-pass --requests 200 --concurrency 20
+
+Incidents are used round-robin. Latency percentiles, status codes and the
+server's /api/metrics/llm snapshot are printed at the end.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+ENDPOINTS = {
+    "first-pass": "/api/ai-analysis-first-pass",
+    "report": "/api/generate-rca-report",
+    "report-stream": "/api/generate-rca-report/stream",
+}
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, incident_id: str, refresh: bool):
+    body = {"incident_id": incident_id, "refresh": refresh}
+    started = time.perf_counter()
+    first_byte = None
+
+    if endpoint == "report-stream":
+        async with client.stream("POST", ENDPOINTS[endpoint], json=body) as response:
+            async for _ in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+            status = response.status_code
+    else:
+        response = await client.post(ENDPOINTS[endpoint], json=body)
+        status = response.status_code
+
+    return status, (time.perf_counter() - started) * 1000, (first_byte or 0) * 1000
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(args):
+    incident_ids = [value.strip() for value in args.incident_ids.split(",") if value.strip()]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        async def one(index: int):
+            async with semaphore:
+                try:
+                    results.append(await send(client, args.endpoint, incident_ids[index % len(incident_ids)], args.refresh))
+                except httpx.HTTPError as e:
+                    results.append((e.__class__.__name__, 0.0, 0.0))
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one(index) for index in range(args.requests)])
+        elapsed = time.perf_counter() - started
+
+        try:
+            llm_metrics = (await client.get("/api/metrics/llm")).json()
+        except (httpx.HTTPError, ValueError):
+            llm_metrics = None
+
+    latencies = [latency for status, latency, _ in results if status == 200]
+    first_bytes = [first for status, _, first in results if status == 200 and first]
+
+    print(f"{args.requests} requests to {args.endpoint}, concurrency {args.concurrency}, {elapsed:.2f}s")
+    print(f"throughput: {len(results) / elapsed:.2f} req/s")
+    print(f"status codes: {dict(Counter(status for status, _, _ in results))}")
+    if latencies:
+        print(
+            f"latency ms: mean {statistics.mean(latencies):.1f}  p50 {percentile(latencies, 0.5):.1f}  "
+            f"p95 {percentile(latencies, 0.95):.1f}  p99 {percentile(latencies, 0.99):.1f}  max {max(latencies):.1f}"
+        )
+    if first_bytes:
+        print(f"time to first byte ms: p50 {percentile(first_bytes, 0.5):.1f}  p95 {percentile(first_bytes, 0.95):.1f}")
+    if llm_metrics:
+        print("\n/api/metrics/llm:")
+        print(json.dumps(llm_metrics, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the analysis and report endpoints")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--incident-ids", required=True, help="Comma-separated incident ids")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="first-pass")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--refresh", action="store_true", help="Bypass the LLM response cache")
+    asyncio.run(run(parser.parse_args()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,15 +4,36 @@ from dotenv import load_dotenv
 import os
 from contextlib import asynccontextmanager
 
-from routers import documents, analysis, reports, pdf_export, auth
+from routers import documents, analysis, reports, pdf_export, auth, metrics, similar_incidents, search
 from utils.database import Database
+from services.processing_pool import ProcessingPool
+from services.document_processor import check_ocr_backend
+from utils.async_storage import AsyncStorageClient
+from services.job_queue import DocumentJobQueue
+from services.llm_client import LLMClient
+from services.audit_log import AuditLog
+from services.document_digest import DocumentDigestService
+from services.prompt_budget import TokenCounter
 
 load_dotenv()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    check_ocr_backend()
     await Database.connect()
+    ProcessingPool.start()
+    LLMClient.start()
+    await TokenCounter.load()
+    AuditLog.start()
+    DocumentJobQueue.start()
     yield
+    await DocumentJobQueue.stop()
+    await reports.wait_for_report_streams()
+    await DocumentDigestService.wait_for_background()
+    await AuditLog.stop()
+    ProcessingPool.shutdown()
+    await LLMClient.close()
+    await AsyncStorageClient.close()
     await Database.disconnect()
 
 app = FastAPI(
@@ -34,7 +55,10 @@ app.include_router(auth.router, prefix="/api")
 app.include_router(documents.router, prefix="/api", tags=["documents"])
 app.include_router(analysis.router, prefix="/api", tags=["analysis"])
 app.include_router(reports.router, prefix="/api", tags=["reports"])
+app.include_router(similar_incidents.router, prefix="/api", tags=["similar incidents"])
+app.include_router(search.router, prefix="/api", tags=["search"])
 app.include_router(pdf_export.router, prefix="/api", tags=["pdf"])
+app.include_router(metrics.router, prefix="/api")
 
 @app.get("/")
 async def root():
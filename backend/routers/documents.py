@@ -1,14 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional
-import httpx
-import os
-import json
+import uuid
 
-from utils.database import Database
-from utils.storage import StorageClient
 from utils.auth import get_current_user
-from services.document_processor import DocumentProcessor
+from services.document_pipeline import load_metadata
+from services.job_queue import DocumentJobQueue, QueueFullError, JobConflictError
+from services.batch_processor import IncidentBatchProcessor
+from utils.database import Database
 
 router = APIRouter()
 
@@ -16,78 +15,104 @@ class ProcessDocumentRequest(BaseModel):
     document_id: str
     file_type: str
 
-class ProcessDocumentResponse(BaseModel):
+class ProcessDocumentJobResponse(BaseModel):
     success: bool
+    job_id: str
     document_id: str
-    ocr_text: str
-    ai_description: str
-
-async def get_ai_description(file_data: bytes, file_type: str) -> str:
-    if not os.getenv("OPENAI_API_KEY"):
-        return "Image uploaded successfully. OCR text extraction completed."
-
-    try:
-        from services.ai_service import AIService
-        return await AIService.generate_image_description(file_data, file_type)
-    except Exception as e:
-        print(f"AI description failed, using fallback: {e}")
-        return "Image uploaded successfully. OCR text extraction completed."
+    status: str
 
-@router.post("/process-document", response_model=ProcessDocumentResponse)
+class DocumentJobStatusResponse(BaseModel):
+    job_id: str
+    document_id: str
+    status: str
+    document_status: Optional[str] = None
+    progress: dict
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+@router.post("/process-document", response_model=ProcessDocumentJobResponse, status_code=202)
 async def process_document(request: ProcessDocumentRequest, current_user: dict = Depends(get_current_user)):
     try:
-        await Database.execute(
-            'UPDATE documents SET extracted_text = $1 WHERE id = $2',
-            'processing', request.document_id
-        )
-
         doc_data = await Database.fetch_one(
-            'SELECT * FROM documents WHERE id = $1',
+            'SELECT id FROM documents WHERE id = $1',
             request.document_id
         )
 
         if not doc_data:
             raise HTTPException(status_code=404, detail="Document not found")
 
-        file_data = StorageClient.download_file(doc_data["storage_path"])
+        job = await DocumentJobQueue.enqueue(request.document_id, request.file_type, current_user["user_id"])
 
-        if not file_data:
-            raise HTTPException(status_code=404, detail="File not found in storage")
-
-        ocr_text = ""
-        ai_description = ""
+        return ProcessDocumentJobResponse(
+            success=True,
+            job_id=str(job["id"]),
+            document_id=request.document_id,
+            status=job["status"]
+        )
 
-        if request.file_type.startswith("image/"):
-            ocr_text = DocumentProcessor.extract_text_from_image(file_data)
-            ai_description = await get_ai_description(file_data, request.file_type)
-        elif request.file_type == "application/pdf":
-            ocr_text = DocumentProcessor.extract_text_from_pdf(file_data)
-            ai_description = "PDF document processed for text extraction"
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        print(f"Error queueing document: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue document: {str(e)}")
 
-        await Database.execute(
-            'UPDATE documents SET extracted_text = $1, metadata = metadata || $2 WHERE id = $3',
-            ocr_text,
-            json.dumps({"ai_description": ai_description, "status": "completed"}),
-            request.document_id
+@router.get("/process-document/jobs/{job_id}", response_model=DocumentJobStatusResponse)
+async def get_document_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="job_id must be a UUID")
+
+    job = await DocumentJobQueue.get_job(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    document = await Database.fetch_one(
+        'SELECT metadata FROM documents WHERE id = $1',
+        job["document_id"]
+    )
+
+    return DocumentJobStatusResponse(
+        job_id=str(job["id"]),
+        document_id=str(job["document_id"]),
+        status=job["status"],
+        document_status=load_metadata(document["metadata"]).get("status") if document else None,
+        progress=load_metadata(job["progress"]),
+        attempts=job["attempts"],
+        max_attempts=job["max_attempts"],
+        error=job["error"],
+        result=load_metadata(job["result"]) or None,
+        created_at=job["created_at"].isoformat() if job["created_at"] else None,
+        started_at=job["started_at"].isoformat() if job["started_at"] else None,
+        finished_at=job["finished_at"].isoformat() if job["finished_at"] else None
+    )
+
+@router.post("/incidents/{incident_id}/process-documents")
+async def process_incident_documents(incident_id: str, current_user: dict = Depends(get_current_user)):
+    try:
+        incident = await Database.fetch_one(
+            'SELECT id FROM incidents WHERE id = $1',
+            incident_id
         )
 
-        return ProcessDocumentResponse(
-            success=True,
-            document_id=request.document_id,
-            ocr_text=ocr_text,
-            ai_description=ai_description
-        )
+        if not incident:
+            raise HTTPException(status_code=404, detail="Incident not found")
+
+        summary = await IncidentBatchProcessor.process_incident(incident_id, performed_by=current_user["user_id"])
+        return {"success": True, **summary}
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error processing document: {e}")
-        try:
-            await Database.execute(
-                'UPDATE documents SET metadata = metadata || $1 WHERE id = $2',
-                json.dumps({"status": "failed"}),
-                request.document_id
-            )
-        except:
-            pass
-        raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
+        print(f"Error processing incident documents: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to process documents: {str(e)}")
@@ -0,0 +1,54 @@
+from fastapi import APIRouter
+
+from services.processing_pool import ProcessingPool
+from services.extraction_cache import ExtractionCache
+from utils.async_storage import AsyncStorageClient
+from services.job_queue import DocumentJobQueue
+from services.llm_client import LLMClient
+from services.llm_cache import LLMCache
+from utils.single_flight import SingleFlight
+from utils.database import Database
+from services.similar_incidents import SimilarIncidentIndex
+from services.audit_log import AuditLog
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("/processing-pool")
+async def processing_pool_metrics():
+    return ProcessingPool.stats()
+
+@router.get("/extraction-cache")
+async def extraction_cache_metrics():
+    return ExtractionCache.stats()
+
+@router.get("/storage")
+async def storage_metrics():
+    return AsyncStorageClient.stats()
+
+@router.get("/document-jobs")
+async def document_job_metrics():
+    return await DocumentJobQueue.stats()
+
+@router.get("/llm")
+async def llm_metrics():
+    return LLMClient.stats()
+
+@router.get("/llm-cache")
+async def llm_cache_metrics():
+    return LLMCache.stats()
+
+@router.get("/single-flight")
+async def single_flight_metrics():
+    return SingleFlight.stats()
+
+@router.get("/similar-index")
+async def similar_index_metrics():
+    return SimilarIncidentIndex.stats()
+
+@router.get("/database")
+async def database_metrics():
+    return Database.stats()
+
+@router.get("/audit-log")
+async def audit_log_metrics():
+    return AuditLog.stats()
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from utils.db_client import get_db_pool
+from utils.database import Database
 from services.pdf_generator import generate_rca_pdf
 
 router = APIRouter(prefix="/pdf", tags=["PDF Export"])
@@ -14,9 +14,7 @@ class PDFExportRequest(BaseModel):
 @router.post("/export-rca-report")
 async def export_rca_report(request: PDFExportRequest):
     try:
-        pool = await get_db_pool()
-
-        async with pool.acquire() as conn:
+        async with Database.acquire() as conn:
             incident_data = await conn.fetchrow(
                 'SELECT * FROM incidents WHERE id = $1',
                 request.incident_id
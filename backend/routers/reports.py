@@ -1,92 +1,168 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, Optional, Set
 from datetime import datetime
+import asyncio
 import json
+import uuid
 
-from utils.db_client import get_db_pool
 from services.ai_service import AIService
+from services.document_digest import DocumentDigestService
+from services.incident_loader import IncidentLoader
+from services.result_writer import ResultWriter
+from services.llm_client import LLMUnavailableError
 
 router = APIRouter()
 
+# Report streams keep running after the client disconnects so the report is
+# still saved; hold references so the tasks are not garbage collected.
+_background_streams: Set[asyncio.Task] = set()
+
 class GenerateReportRequest(BaseModel):
     incident_id: str
+    refresh: bool = False
 
 class GenerateReportResponse(BaseModel):
     success: bool
     report_id: str
     report_content: str
 
+async def _load_report_incident(incident_id: str) -> Dict[str, Any]:
+    try:
+        uuid.UUID(incident_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="incident_id must be a UUID")
+
+    incident_dict = await IncidentLoader.load(incident_id, children=("analyses", "witnesses", "documents"))
+
+    if not incident_dict:
+        raise HTTPException(status_code=404, detail="Incident not found")
+
+    if incident_dict.get('investigation_status') != 'COMPLETED':
+        raise HTTPException(
+            status_code=400,
+            detail="Incident investigation must be completed before generating RCA report"
+        )
+
+    if incident_dict['document_digest'] is None:
+        DocumentDigestService.schedule_incident(incident_id)
+
+    return incident_dict
+
+async def _save_report(incident_id: str, report_content: str) -> str:
+    report_id = await ResultWriter.save(
+        "rca_reports",
+        {
+            "incident_id": incident_id,
+            "report_content": report_content,
+            "generated_at": datetime.utcnow(),
+            "status": "DRAFT",
+        },
+        incident_id=incident_id,
+        action_type="RCA_REPORT_GENERATED",
+        entity_type="rca_report",
+        id_key="report_id",
+        action_details={"report_length": len(report_content)}
+    )
+
+    if not report_id:
+        raise HTTPException(status_code=500, detail="Failed to save report")
+
+    return report_id
+
+async def wait_for_report_streams(timeout: float = 30):
+    """Give in-flight report streams a chance to finish and save on shutdown."""
+    if _background_streams:
+        await asyncio.wait(set(_background_streams), timeout=timeout)
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @router.post("/generate-rca-report", response_model=GenerateReportResponse)
 async def generate_rca_report(request: GenerateReportRequest):
     try:
-        pool = await get_db_pool()
-
-        async with pool.acquire() as conn:
-            incident_data = await conn.fetchrow(
-                'SELECT * FROM incidents WHERE id = $1',
-                request.incident_id
-            )
-
-            if not incident_data:
-                raise HTTPException(status_code=404, detail="Incident not found")
-
-            incident_dict = dict(incident_data)
-
-            if incident_dict.get('investigation_status') != 'COMPLETED':
-                raise HTTPException(
-                    status_code=400,
-                    detail="Incident investigation must be completed before generating RCA report"
-                )
-
-            analyses = await conn.fetch(
-                'SELECT * FROM incident_analyses WHERE incident_id = $1',
-                request.incident_id
-            )
-            witnesses = await conn.fetch(
-                'SELECT * FROM witnesses WHERE incident_id = $1',
-                request.incident_id
-            )
-            documents = await conn.fetch(
-                'SELECT * FROM incident_documents WHERE incident_id = $1',
-                request.incident_id
-            )
-
-            incident_dict['analyses'] = [dict(a) for a in analyses]
-            incident_dict['witnesses'] = [dict(w) for w in witnesses]
-            incident_dict['documents'] = [dict(d) for d in documents]
-
-        report_content = await AIService.generate_rca_report(incident_dict)
-
-        async with pool.acquire() as conn:
-            report_id = await conn.fetchval(
-                '''INSERT INTO rca_reports (incident_id, report_content, generated_at, status)
-                   VALUES ($1, $2, $3, $4) RETURNING id''',
-                request.incident_id, report_content, datetime.utcnow(), "DRAFT"
-            )
-
-            if not report_id:
-                raise HTTPException(status_code=500, detail="Failed to save report")
-
-            action_details = json.dumps({
-                "report_id": str(report_id),
-                "report_length": len(report_content)
-            })
-            await conn.execute(
-                '''INSERT INTO audit_logs (incident_id, action_type, action_details, entity_type, entity_id, performed_by)
-                   VALUES ($1, $2, $3, $4, $5, $6)''',
-                request.incident_id, "RCA_REPORT_GENERATED", action_details,
-                "rca_report", str(report_id), None
-            )
+        incident_dict = await _load_report_incident(request.incident_id)
+
+        report_content = await AIService.generate_rca_report(incident_dict, use_cache=not request.refresh)
+
+        report_id = await _save_report(request.incident_id, report_content)
 
         return GenerateReportResponse(
             success=True,
-            report_id=str(report_id),
+            report_id=report_id,
             report_content=report_content
         )
 
     except HTTPException:
         raise
+    except LLMUnavailableError as e:
+        print(f"LLM unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="AI service is temporarily unavailable, please retry",
+            headers={"Retry-After": str(int(e.retry_after or 30))}
+        )
     except Exception as e:
         print(f"Error generating RCA report: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
+
+@router.post("/generate-rca-report/stream")
+async def stream_rca_report(request: GenerateReportRequest):
+    """Stream the report over Server-Sent Events.
+
+    Emits ``started``, then ``section`` events as each report section is
+    ready (or ``token`` events as text arrives when RCA_REPORT_SECTIONED is
+    off), then ``done`` with the saved report id (or ``error``). Generation runs in a background
+    task that saves the report even if the client goes away mid-stream.
+    """
+    try:
+        incident_dict = await _load_report_incident(request.incident_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error loading incident for RCA report stream: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
+
+    events: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def produce():
+        chunks = []
+        try:
+            async for section, text in AIService.stream_rca_report(incident_dict, use_cache=not request.refresh):
+                chunks.append(text)
+                if section is None:
+                    events.put_nowait(_sse_event("token", {"text": text}))
+                else:
+                    events.put_nowait(_sse_event("section", {"title": section, "text": text}))
+
+            report_content = "".join(chunks) or "Unable to generate report"
+            report_id = await _save_report(request.incident_id, report_content)
+            events.put_nowait(_sse_event("done", {"report_id": report_id, "report_length": len(report_content)}))
+        except Exception as e:
+            print(f"Error streaming RCA report: {e}")
+            if isinstance(e, LLMUnavailableError):
+                detail = "AI service is temporarily unavailable, please retry"
+            else:
+                detail = f"Failed to generate report: {str(e)}"
+            events.put_nowait(_sse_event("error", {"detail": detail}))
+        finally:
+            events.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    _background_streams.add(task)
+    task.add_done_callback(_background_streams.discard)
+
+    async def event_stream():
+        yield _sse_event("started", {"incident_id": request.incident_id})
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
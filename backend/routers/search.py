@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
+import uuid
+
+from utils.auth import get_current_user
+from services.search import SearchService, SEARCH_KINDS
+
+router = APIRouter()
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=2, max_length=500),
+    page: int = Query(1, ge=1, le=1000),
+    page_size: int = Query(20, ge=1, le=100),
+    kind: Optional[List[str]] = Query(None),
+    incident_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Search document text and incidents, e.g. ``q="scaffold tag" expired``.
+
+    ``q`` uses web-search syntax (quoted phrases, ``or``, ``-word``). Pass
+    ``kind=document`` or ``kind=incident`` to restrict the result types.
+    """
+    kinds = kind or list(SEARCH_KINDS)
+    unknown = [k for k in kinds if k not in SEARCH_KINDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {', '.join(unknown)}")
+
+    if incident_id is not None:
+        try:
+            uuid.UUID(incident_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="incident_id must be a UUID")
+
+    try:
+        return await SearchService.search(q, page, page_size, kinds, incident_id)
+    except Exception as e:
+        print(f"Error searching: {e}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
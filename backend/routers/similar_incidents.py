@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+import uuid
+
+from utils.auth import get_current_user
+from services.similar_incidents import SimilarIncidentIndex
+
+router = APIRouter()
+
+@router.get("/incidents/{incident_id}/similar")
+async def similar_incidents(
+    incident_id: str,
+    limit: int = Query(5, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        uuid.UUID(incident_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="incident_id must be a UUID")
+
+    try:
+        matches = await SimilarIncidentIndex.similar_to_incident(incident_id, limit)
+        if matches is None:
+            raise HTTPException(status_code=404, detail="Incident not found")
+
+        return {"incident_id": incident_id, "similar": matches}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error finding similar incidents: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to find similar incidents: {str(e)}")
+
+@router.post("/incidents/similar-index/rebuild")
+async def rebuild_similar_index(
+    full: bool = False,
+    limit: int = Query(1000, ge=1),
+    current_user: dict = Depends(get_current_user)
+):
+    """Index incidents that are missing from the index; ``full`` re-embeds every incident."""
+    try:
+        indexed = await SimilarIncidentIndex.backfill(limit=limit, full=full)
+        await SimilarIncidentIndex.sync(force=True)
+        return {"success": True, "indexed": indexed, **SimilarIncidentIndex.stats()}
+
+    except Exception as e:
+        print(f"Error rebuilding similar-incident index: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild index: {str(e)}")
@@ -1,20 +1,145 @@
-import openai
+import asyncio
 import os
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Awaitable, List, Optional, Tuple
 import base64
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from services.llm_client import LLMClient
+from services.llm_scheduler import LLMScheduler
+from services.llm_cache import LLMCache
+from services.prompt_budget import PromptBudget, TokenCounter
+
+IMAGE_DESCRIPTION_FALLBACKS = (
+    "Unable to generate image description",
+    "Error: Could not generate image description. Image uploaded successfully.",
+)
+
+# (title, what to write, inputs in priority order, max completion tokens).
+# Each section is generated and cached on its own, so a change to one input
+# only regenerates the sections that read it.
+REPORT_SECTIONS = (
+    ("Executive Summary", "a concise overview of what happened, why it happened and the key actions",
+     ("second_analysis", "description", "first_analysis"), 400),
+    ("Incident Overview", "the facts of the incident: what, where, when, who was involved and the consequences",
+     ("description", "witnesses"), 400),
+    ("Investigation Methodology", "how the investigation was carried out and which evidence was reviewed",
+     ("first_analysis", "documents"), 300),
+    ("Immediate Causes", "the direct causes (unsafe acts and conditions) as a bulleted list",
+     ("first_analysis", "description", "documents"), 400),
+    ("Root Causes", "the underlying systemic causes, each with a short justification",
+     ("second_analysis", "first_analysis"), 500),
+    ("Contributing Factors", "factors that made the incident more likely or more severe, as a bulleted list",
+     ("second_analysis", "witnesses", "documents"), 400),
+    ("Timeline of Events", "a chronological timeline of the events before, during and after the incident",
+     ("description", "witnesses", "documents"), 400),
+    ("Corrective Actions", "a Markdown table of corrective actions with responsibility, timeline and priority",
+     ("second_analysis", "first_analysis"), 600),
+    ("Preventive Measures", "measures that prevent recurrence here and at similar sites, as a bulleted list",
+     ("second_analysis",), 400),
+    ("Recommendations", "prioritized recommendations for management",
+     ("second_analysis", "first_analysis"), 400),
+    ("Lessons Learned", "the key lessons for the wider organization",
+     ("second_analysis", "description"), 300),
+)
+
+REPORT_SOURCE_LABELS = {
+    "description": "Description",
+    "first_analysis": "Initial Analysis",
+    "second_analysis": "Deep Analysis",
+    "witnesses": "Witness statements",
+    "documents": "Document excerpts",
+}
+
+REPORT_SIGN_OFF = """| Role | Name | Signature | Date |
+|------|------|-----------|------|
+| Lead Investigator | | | |
+| HSE Manager | | | |
+| Operations Manager | | | |"""
 
 class AIService:
     @staticmethod
-    def _truncate_text(text: str, max_length: int = 1000) -> str:
-        """Truncate text to reduce token usage"""
-        if not text or len(text) <= max_length:
-            return text
-        return text[:max_length] + "... [truncated]"
+    def _prompt_budget(name: str, default: int) -> PromptBudget:
+        """Token budget for the variable fields of one prompt (PROMPT_BUDGET_<NAME>)."""
+        return PromptBudget(int(os.getenv(f"PROMPT_BUDGET_{name.upper()}", default)))
 
     @staticmethod
-    async def generate_image_description(image_data: bytes, file_type: str) -> str:
+    def _witness_statements(witnesses: List[Dict[str, Any]]) -> List[str]:
+        statements = []
+        for witness in witnesses:
+            statement = witness.get('statement') or witness.get('testimony')
+            if statement:
+                statements.append(f"{witness.get('name') or 'Witness'}: {statement}")
+        return statements
+
+    @staticmethod
+    def _document_excerpts(documents: List[Dict[str, Any]]) -> List[str]:
+        excerpts = []
+        for document in documents:
+            text = document.get('extracted_text') or document.get('ocr_text')
+            if text and text != 'processing':
+                excerpts.append(f"[{document.get('filename') or 'document'}] {text}")
+        return excerpts
+
+    @staticmethod
+    def _document_context(incident_data: Dict[str, Any]) -> List[str]:
+        """The stored document digest when the caller loaded one, else raw excerpts."""
+        digest = incident_data.get('document_digest')
+        if digest:
+            return [digest]
+        return AIService._document_excerpts(incident_data.get('documents', []))
+
+    @staticmethod
+    async def _complete(
+        use_cache: bool = True,
+        timeout: Optional[float] = None,
+        priority: int = LLMScheduler.INTERACTIVE,
+        **params
+    ) -> Optional[str]:
+        """Run a chat completion through LLMCache; ``use_cache=False`` forces a fresh call."""
+        cacheable = use_cache and LLMCache.enabled()
+        if cacheable:
+            key = LLMCache.make_key(params)
+            cached = await LLMCache.get(key)
+            if cached is not None:
+                return cached["content"]
+        elif LLMCache.enabled():
+            LLMCache.count_bypass()
+
+        response = await LLMClient.chat(timeout=timeout, priority=priority, **params)
+        content = response.choices[0].message.content
+
+        if cacheable and content:
+            usage = response.usage
+            await LLMCache.set(
+                key, params["model"], content,
+                usage.prompt_tokens if usage else 0,
+                usage.completion_tokens if usage else 0
+            )
+        return content
+
+    @staticmethod
+    async def summarize_evidence(text: str, purpose: str, max_tokens: int) -> str:
+        """Condense document text for the digest (see DocumentDigestService)."""
+        prompt = f"""Summarize the following {purpose} for an HSE incident investigation.
+Keep every fact that matters for root cause analysis: equipment, conditions, readings, times, people's roles, actions taken and failures.
+Leave out boilerplate. Answer in at most {max_tokens} tokens of plain text.
+
+{text}"""
+
+        content = await AIService._complete(
+            priority=LLMScheduler.BATCH,
+            model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=max_tokens
+        )
+        return TokenCounter.truncate((content or "").strip(), max_tokens)
+
+    @staticmethod
+    async def generate_image_description(
+        image_data: bytes,
+        file_type: str,
+        priority: int = LLMScheduler.BATCH
+    ) -> str:
         try:
             base64_image = base64.b64encode(image_data).decode('utf-8')
 
@@ -29,8 +154,11 @@ class AIService:
 
 Provide a factual, professional description suitable for an incident investigation report."""
 
-            response = await openai.chat.completions.create(
-                model="gpt-4o-mini",
+            # Not through _complete: image descriptions are cached by content hash
+            # in ExtractionCache, and LLMCache's bypass counter tracks refreshes only.
+            response = await LLMClient.chat(
+                priority=priority,
+                model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
                 messages=[
                     {
                         "role": "user",
@@ -48,25 +176,43 @@ Provide a factual, professional description suitable for an incident investigati
                 max_tokens=500
             )
 
-            return response.choices[0].message.content or "Unable to generate image description"
+            return response.choices[0].message.content or IMAGE_DESCRIPTION_FALLBACKS[0]
         except Exception as e:
             print(f"Error generating image description: {e}")
-            return "Error: Could not generate image description. Image uploaded successfully."
+            return IMAGE_DESCRIPTION_FALLBACKS[1]
 
     @staticmethod
-    async def perform_first_pass_analysis(incident_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def perform_first_pass_analysis(incident_data: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
         try:
-            description = AIService._truncate_text(str(incident_data.get('description', 'N/A')), 600)
+            budget = AIService._prompt_budget("first_pass", 2000)
+            budget.add("description", str(incident_data.get('description', 'N/A')), priority=0)
+            budget.add_items("witnesses", AIService._witness_statements(incident_data.get('witnesses', [])), priority=1)
+            budget.add_items("documents", AIService._document_context(incident_data), priority=2)
+            budget.add_items("similar", incident_data.get('similar_incidents', []), priority=3, separator="\n")
+            fields = budget.allocate()
+
+            similar = ""
+            if fields['similar']:
+                similar = f"""
+Root causes found for similar past incidents (use only where the facts support them):
+{fields['similar']}
+"""
 
             prompt = f"""Analyze incident:
 
 Title: {incident_data.get('title', 'N/A')}
-Description: {description}
+Description: {fields['description']}
 Severity: {incident_data.get('severity', 'N/A')}
 Location: {incident_data.get('location', 'N/A')}
 Date: {incident_data.get('incident_date', 'N/A')}
 Witnesses: {len(incident_data.get('witnesses', []))} | Documents: {len(incident_data.get('documents', []))}
 
+Witness statements:
+{fields['witnesses'] or 'None'}
+
+Document excerpts:
+{fields['documents'] or 'None'}
+{similar}
 Provide:
 1. Immediate causes
 2. Observable facts
@@ -75,14 +221,15 @@ Provide:
 
 Format as JSON with keys: immediate_causes, observable_facts, investigation_areas, risk_level"""
 
-            response = await openai.chat.completions.create(
-                model="gpt-4o-mini",
+            content = await AIService._complete(
+                use_cache=use_cache,
+                model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=800
             )
 
             return {
-                "analysis": response.choices[0].message.content,
+                "analysis": content,
                 "confidence_score": 0.7
             }
         except Exception as e:
@@ -93,21 +240,32 @@ Format as JSON with keys: immediate_causes, observable_facts, investigation_area
     async def perform_second_pass_analysis(
         incident_data: Dict[str, Any],
         first_pass: Dict[str, Any],
-        human_feedback: str
+        human_feedback: str,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         try:
-            description = AIService._truncate_text(str(incident_data.get('description', 'N/A')), 500)
-            first_analysis = AIService._truncate_text(str(first_pass.get('analysis', 'N/A')), 600)
-            feedback = AIService._truncate_text(str(human_feedback), 400)
+            budget = AIService._prompt_budget("second_pass", 3000)
+            budget.add("feedback", str(human_feedback), priority=0)
+            budget.add("description", str(incident_data.get('description', 'N/A')), priority=1)
+            budget.add("first_pass", str(first_pass.get('analysis', 'N/A')), priority=2)
+            budget.add_items("witnesses", AIService._witness_statements(incident_data.get('witnesses', [])), priority=3)
+            budget.add_items("documents", AIService._document_context(incident_data), priority=4)
+            fields = budget.allocate()
 
             prompt = f"""Deep root cause analysis:
 
 Incident: {incident_data.get('title', 'N/A')}
-Description: {description}
+Description: {fields['description']}
 Severity: {incident_data.get('severity', 'N/A')}
 
-First Pass: {first_analysis}
-Expert Feedback: {feedback}
+First Pass: {fields['first_pass']}
+Expert Feedback: {fields['feedback']}
+
+Witness statements:
+{fields['witnesses'] or 'None'}
+
+Document excerpts:
+{fields['documents'] or 'None'}
 
 Provide:
 1. Root causes (systemic issues)
@@ -119,14 +277,15 @@ Provide:
 
 Format as JSON with keys: root_causes, contributing_factors, control_failures, corrective_actions, preventive_measures, implementation_timeline"""
 
-            response = await openai.chat.completions.create(
-                model="gpt-4o-mini",
+            content = await AIService._complete(
+                use_cache=use_cache,
+                model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1500
             )
 
             return {
-                "analysis": response.choices[0].message.content,
+                "analysis": content,
                 "confidence_score": 0.9
             }
         except Exception as e:
@@ -137,23 +296,33 @@ Format as JSON with keys: root_causes, contributing_factors, control_failures, c
     async def perform_comprehensive_second_pass(
         incident: Dict[str, Any],
         first_pass: Dict[str, Any],
-        review: Dict[str, Any]
+        review: Dict[str, Any],
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         try:
-            description = AIService._truncate_text(str(incident.get('description', 'N/A')), 500)
-            reviewer_notes = AIService._truncate_text(str(review.get('reviewer_notes', 'None')), 300)
-
-            hazards = first_pass.get('identified_hazards', [])[:5]
-            causes = first_pass.get('potential_causes', [])[:5]
+            budget = AIService._prompt_budget("comprehensive_second_pass", 3000)
+            budget.add("reviewer_notes", str(review.get('reviewer_notes', 'None')), priority=0)
+            budget.add("description", str(incident.get('description', 'N/A')), priority=1)
+            budget.add("hazards", str(first_pass.get('identified_hazards', [])[:5]), priority=2)
+            budget.add("causes", str(first_pass.get('potential_causes', [])[:5]), priority=2)
+            budget.add_items("witnesses", AIService._witness_statements(incident.get('witnesses', [])), priority=3)
+            budget.add_items("documents", AIService._document_context(incident), priority=4)
+            fields = budget.allocate()
 
             prompt = f"""HSE RCA for: {incident.get('title', 'N/A')}
 Severity: {incident.get('severity', 'N/A')} | Date: {incident.get('incident_date', 'N/A')}
-Description: {description}
+Description: {fields['description']}
+
+First Pass Hazards: {fields['hazards']}
+First Pass Causes: {fields['causes']}
+
+Expert Review: {fields['reviewer_notes']}
 
-First Pass Hazards: {hazards}
-First Pass Causes: {causes}
+Witness statements:
+{fields['witnesses'] or 'None'}
 
-Expert Review: {reviewer_notes}
+Document excerpts:
+{fields['documents'] or 'None'}
 
 Produce RCA with "5 Whys" and "Fishbone" analysis. Return JSON with:
 1. refinedAnalysis: {{executiveSummary, incidentSequence, evidenceReview}}
@@ -166,8 +335,9 @@ Produce RCA with "5 Whys" and "Fishbone" analysis. Return JSON with:
 
 Return ONLY valid JSON."""
 
-            response = await openai.chat.completions.create(
-                model="gpt-4o-mini",
+            analysis_text = await AIService._complete(
+                use_cache=use_cache,
+                model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
                 messages=[
                     {
                         "role": "system",
@@ -177,10 +347,10 @@ Return ONLY valid JSON."""
                 ],
                 temperature=0.2,
                 max_tokens=2500,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                timeout=float(os.getenv("LLM_LONG_TIMEOUT", 180))
             )
 
-            analysis_text = response.choices[0].message.content
             if not analysis_text:
                 raise Exception("No analysis generated")
 
@@ -201,28 +371,49 @@ Return ONLY valid JSON."""
             raise
 
     @staticmethod
-    async def generate_rca_report(incident_data: Dict[str, Any]) -> str:
-        try:
-            analyses = incident_data.get('analyses', [])
-            first_pass = next((a for a in analyses if a['analysis_type'] == 'FIRST_PASS'), None)
-            second_pass = next((a for a in analyses if a['analysis_type'] == 'SECOND_PASS'), None)
+    def _rca_report_sources(incident_data: Dict[str, Any]) -> Dict[str, Any]:
+        analyses = incident_data.get('analyses', [])
+        first_pass = next((a for a in analyses if a['analysis_type'] == 'FIRST_PASS'), None)
+        second_pass = next((a for a in analyses if a['analysis_type'] == 'SECOND_PASS'), None)
+
+        return {
+            "description": str(incident_data.get('description', 'N/A')),
+            "first_analysis": str(first_pass.get('findings', {}).get('analysis', 'N/A') if first_pass else 'N/A'),
+            "second_analysis": str(second_pass.get('findings', {}).get('analysis', 'N/A') if second_pass else 'N/A'),
+            "witnesses": AIService._witness_statements(incident_data.get('witnesses', [])),
+            "documents": AIService._document_context(incident_data),
+        }
+
+    @staticmethod
+    def _rca_report_params(incident_data: Dict[str, Any]) -> Dict[str, Any]:
+        sources = AIService._rca_report_sources(incident_data)
 
-            description = AIService._truncate_text(str(incident_data.get('description', 'N/A')), 400)
-            first_analysis = AIService._truncate_text(str(first_pass.get('findings', {}).get('analysis', 'N/A') if first_pass else 'N/A'), 500)
-            second_analysis = AIService._truncate_text(str(second_pass.get('findings', {}).get('analysis', 'N/A') if second_pass else 'N/A'), 800)
+        budget = AIService._prompt_budget("rca_report", 4000)
+        budget.add("second_analysis", sources["second_analysis"], priority=0)
+        budget.add("description", sources["description"], priority=1)
+        budget.add("first_analysis", sources["first_analysis"], priority=2)
+        budget.add_items("witnesses", sources["witnesses"], priority=3)
+        budget.add_items("documents", sources["documents"], priority=4)
+        fields = budget.allocate()
 
-            prompt = f"""Generate HSE RCA report:
+        prompt = f"""Generate HSE RCA report:
 
 Incident: {incident_data.get('title', 'N/A')}
 Date: {incident_data.get('incident_date', 'N/A')} | Location: {incident_data.get('location', 'N/A')}
 Severity: {incident_data.get('severity', 'N/A')}
-Description: {description}
+Description: {fields['description']}
 
-Initial Analysis: {first_analysis}
-Deep Analysis: {second_analysis}
+Initial Analysis: {fields['first_analysis']}
+Deep Analysis: {fields['second_analysis']}
 
 Witnesses: {len(incident_data.get('witnesses', []))} | Documents: {len(incident_data.get('documents', []))}
 
+Witness statements:
+{fields['witnesses'] or 'None'}
+
+Document excerpts:
+{fields['documents'] or 'None'}
+
 Generate professional Markdown report with sections:
 1. Executive Summary
 2. Incident Overview
@@ -237,13 +428,157 @@ Generate professional Markdown report with sections:
 11. Lessons Learned
 12. Sign-off Section"""
 
-            response = await openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=3000
+        return {
+            "model": os.getenv("LLM_MODEL", "gpt-4o-mini"),
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 3000,
+        }
+
+    @staticmethod
+    def _rca_section_params(
+        incident_data: Dict[str, Any],
+        sources: Dict[str, Any],
+        title: str,
+        instructions: str,
+        inputs: tuple,
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        budget = AIService._prompt_budget("rca_section", 1500)
+        for priority, name in enumerate(inputs):
+            if isinstance(sources[name], list):
+                budget.add_items(name, sources[name], priority=priority)
+            else:
+                budget.add(name, sources[name], priority=priority)
+        fields = budget.allocate()
+
+        evidence = "\n\n".join(
+            f"{REPORT_SOURCE_LABELS[name]}:\n{fields[name] or 'None'}" for name in inputs
+        )
+        prompt = f"""You are writing one section of an HSE root cause analysis report.
+
+Incident: {incident_data.get('title', 'N/A')}
+Date: {incident_data.get('incident_date', 'N/A')} | Location: {incident_data.get('location', 'N/A')}
+Severity: {incident_data.get('severity', 'N/A')}
+
+{evidence}
+
+Write only the "{title}" section in professional Markdown: {instructions}. Do not include the section heading."""
+
+        return {
+            "model": os.getenv("LLM_MODEL", "gpt-4o-mini"),
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+        }
+
+    @staticmethod
+    def _rca_section_calls(incident_data: Dict[str, Any], use_cache: bool) -> List[Awaitable[Optional[str]]]:
+        sources = AIService._rca_report_sources(incident_data)
+        timeout = float(os.getenv("LLM_TIMEOUT", 60))
+
+        return [
+            AIService._complete(
+                use_cache=use_cache,
+                timeout=timeout,
+                **AIService._rca_section_params(incident_data, sources, title, instructions, inputs, max_tokens)
             )
+            for title, instructions, inputs, max_tokens in REPORT_SECTIONS
+        ]
 
-            return response.choices[0].message.content or "Unable to generate report"
+    @staticmethod
+    async def stream_rca_report_sections(
+        incident_data: Dict[str, Any],
+        use_cache: bool = True
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """Yield ``(title, markdown)`` for each report section, in order, as it is ready.
+
+        Sections are generated concurrently; the markdown pieces concatenate to
+        the full report. Failed sections are held back until one succeeds, so
+        if every section fails this raises instead of streaming placeholders.
+        """
+        tasks = [asyncio.ensure_future(call) for call in AIService._rca_section_calls(incident_data, use_cache)]
+        try:
+            prefix = f"# HSE Root Cause Analysis Report: {incident_data.get('title', 'N/A')}\n\n"
+            held, failures = [], []
+            for number, ((title, *_), task) in enumerate(zip(REPORT_SECTIONS, tasks), start=1):
+                try:
+                    result = (await task or '').strip()
+                except Exception as e:
+                    print(f"Error generating report section {title}: {e}")
+                    failures.append(e)
+                    result = "_This section could not be generated. Regenerate the report to retry._"
+                held.append((title, f"{prefix}## {number}. {title}\n\n{result}"))
+                prefix = "\n\n"
+                if len(failures) < number:
+                    for section in held:
+                        yield section
+                    held = []
+
+            if len(failures) == len(tasks):
+                raise failures[0]
+            yield "Sign-off", f"\n\n## {len(REPORT_SECTIONS) + 1}. Sign-off\n\n{REPORT_SIGN_OFF}"
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def generate_rca_report_sections(incident_data: Dict[str, Any], use_cache: bool = True) -> str:
+        """Generate the report section by section, concurrently, and assemble it in order."""
+        return "".join([text async for _, text in AIService.stream_rca_report_sections(incident_data, use_cache)])
+
+    @staticmethod
+    async def generate_rca_report(incident_data: Dict[str, Any], use_cache: bool = True) -> str:
+        try:
+            if os.getenv("RCA_REPORT_SECTIONED", "true").lower() == "true":
+                return await AIService.generate_rca_report_sections(incident_data, use_cache)
+
+            content = await AIService._complete(
+                use_cache=use_cache,
+                timeout=float(os.getenv("LLM_LONG_TIMEOUT", 180)),
+                **AIService._rca_report_params(incident_data)
+            )
+
+            return content or "Unable to generate report"
         except Exception as e:
             print(f"Error generating RCA report: {e}")
             raise
+
+    @staticmethod
+    async def stream_rca_report(
+        incident_data: Dict[str, Any],
+        use_cache: bool = True
+    ) -> AsyncIterator[Tuple[Optional[str], str]]:
+        """Yield ``(section, text)`` pieces of the RCA report as it is generated.
+
+        With RCA_REPORT_SECTIONED each piece is a whole section, in order.
+        Otherwise the single completion is streamed token by token with
+        ``section`` None, and a cached report arrives in one piece.
+        """
+        if os.getenv("RCA_REPORT_SECTIONED", "true").lower() == "true":
+            async for title, text in AIService.stream_rca_report_sections(incident_data, use_cache):
+                yield title, text
+            return
+
+        params = AIService._rca_report_params(incident_data)
+        cacheable = use_cache and LLMCache.enabled()
+        if cacheable:
+            key = LLMCache.make_key(params)
+            cached = await LLMCache.get(key)
+            if cached is not None:
+                yield None, cached["content"]
+                return
+        elif LLMCache.enabled():
+            LLMCache.count_bypass()
+
+        chunks = []
+        async for text in LLMClient.stream(timeout=float(os.getenv("LLM_LONG_TIMEOUT", 180)), **params):
+            chunks.append(text)
+            yield None, text
+
+        content = "".join(chunks)
+        if cacheable and content:
+            await LLMCache.set(
+                key, params["model"], content,
+                TokenCounter.count(params["messages"][0]["content"]),
+                TokenCounter.count(content)
+            )
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from utils.database import Database
+
+AUDIT_COLUMNS = ("incident_id", "action_type", "action_details", "entity_type", "entity_id", "performed_by")
+
+INSERT_QUERY = '''INSERT INTO audit_logs (incident_id, action_type, action_details, entity_type, entity_id, performed_by)
+                  VALUES ($1, $2, $3, $4, $5, $6)'''
+
+
+class AuditLog:
+    """Buffered ``audit_logs`` writer.
+
+    ``record()`` appends to an in-process buffer and returns; a background
+    task writes the buffer with ``COPY`` once it holds ``AUDIT_FLUSH_SIZE``
+    rows or every ``AUDIT_FLUSH_INTERVAL`` seconds. When the buffer is at
+    ``AUDIT_BUFFER_MAX`` rows (or the writer is not running) the row is
+    inserted synchronously instead, so audit rows are never dropped to
+    make room. ``stop()`` flushes what is left.
+
+    Only the backend's document processing events go through here. Analysis
+    and report results write their audit row inside the same statement as
+    the result (see ResultWriter), and the frontend inserts its own rows
+    (incident creation, human reviews) through Supabase.
+    """
+
+    _buffer: Deque[tuple] = deque()
+    _flusher: Optional[asyncio.Task] = None
+    _wakeup: Optional[asyncio.Event] = None
+    _flush_lock: Optional[asyncio.Lock] = None
+    _stopping = False
+    _stats = {
+        "buffered": 0,
+        "written": 0,
+        "sync_writes": 0,
+        "flushes": 0,
+        "failed": 0,
+        "total_flush_ms": 0.0,
+        "max_flush_ms": 0.0,
+    }
+
+    @staticmethod
+    def _flush_size() -> int:
+        return int(os.getenv("AUDIT_FLUSH_SIZE", 500))
+
+    @staticmethod
+    def _make_record(
+        incident_id,
+        action_type: str,
+        action_details: Dict[str, Any],
+        entity_type: str,
+        entity_id,
+        performed_by=None
+    ) -> tuple:
+        return (
+            str(incident_id), action_type, json.dumps(action_details or {}), entity_type,
+            str(entity_id) if entity_id is not None else None,
+            str(performed_by) if performed_by is not None else None,
+        )
+
+    @classmethod
+    async def record(
+        cls,
+        incident_id,
+        action_type: str,
+        action_details: Dict[str, Any],
+        entity_type: str,
+        entity_id,
+        performed_by=None
+    ):
+        record = cls._make_record(incident_id, action_type, action_details, entity_type, entity_id, performed_by)
+
+        if cls._flusher is None or len(cls._buffer) >= int(os.getenv("AUDIT_BUFFER_MAX", 10000)):
+            cls._stats["sync_writes"] += 1
+            await cls._insert_rows([record])
+            return
+
+        cls._buffer.append(record)
+        cls._stats["buffered"] += 1
+        if len(cls._buffer) >= cls._flush_size():
+            cls._wakeup.set()
+
+    @classmethod
+    async def _insert_rows(cls, records):
+        """Row-by-row fallback: one bad row (e.g. a deleted incident) only loses itself."""
+        for record in records:
+            try:
+                await Database.execute(INSERT_QUERY, *record)
+                cls._stats["written"] += 1
+            except Exception as e:
+                cls._stats["failed"] += 1
+                print(f"Error writing audit log {record[1]} for {record[4]}: {e}")
+
+    @classmethod
+    async def flush(cls):
+        if cls._flush_lock is None:
+            cls._flush_lock = asyncio.Lock()
+
+        async with cls._flush_lock:
+            while cls._buffer:
+                batch = [cls._buffer.popleft() for _ in range(min(len(cls._buffer), cls._flush_size()))]
+                started = time.perf_counter()
+                try:
+                    async with Database.acquire() as conn:
+                        await conn.copy_records_to_table('audit_logs', records=batch, columns=AUDIT_COLUMNS)
+                    cls._stats["written"] += len(batch)
+                except Exception as e:
+                    print(f"Audit log COPY of {len(batch)} rows failed, inserting row by row: {e}")
+                    await cls._insert_rows(batch)
+
+                elapsed = (time.perf_counter() - started) * 1000
+                cls._stats["flushes"] += 1
+                cls._stats["total_flush_ms"] += elapsed
+                cls._stats["max_flush_ms"] = max(cls._stats["max_flush_ms"], elapsed)
+
+    @classmethod
+    async def _flush_loop(cls):
+        interval = float(os.getenv("AUDIT_FLUSH_INTERVAL", 1))
+        while not cls._stopping:
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            cls._wakeup.clear()
+            try:
+                await cls.flush()
+            except Exception as e:
+                print(f"Error flushing audit log: {e}")
+
+    @classmethod
+    def start(cls):
+        if cls._flusher is None:
+            cls._stopping = False
+            cls._wakeup = asyncio.Event()
+            cls._flusher = asyncio.create_task(cls._flush_loop())
+
+    @classmethod
+    async def stop(cls):
+        """Stop the background flusher and write everything still buffered."""
+        if cls._flusher is not None:
+            # Not cancelled: a flush in progress holds rows popped off the buffer.
+            cls._stopping = True
+            cls._wakeup.set()
+            await asyncio.gather(cls._flusher, return_exceptions=True)
+            cls._flusher = None
+        await cls.flush()
+
+    @classmethod
+    def stats(cls) -> dict:
+        flushes = cls._stats["flushes"]
+        return {
+            "running": cls._flusher is not None,
+            "pending": len(cls._buffer),
+            **cls._stats,
+            "total_flush_ms": round(cls._stats["total_flush_ms"], 2),
+            "max_flush_ms": round(cls._stats["max_flush_ms"], 2),
+            "avg_flush_ms": round(cls._stats["total_flush_ms"] / flushes, 2) if flushes else 0.0,
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from utils.database import Database
+from services.document_pipeline import DocumentPipeline
+from services.document_digest import DocumentDigestService
+from services.audit_log import AuditLog
+
+
+class IncidentBatchProcessor:
+    """Process every unprocessed document of an incident in one call.
+
+    Documents run concurrently (at most BATCH_DOCUMENT_CONCURRENCY at once),
+    OCR and PDF work still goes through ProcessingPool, and all results are
+    written back with a single executemany.
+    """
+
+    @staticmethod
+    async def process_incident(
+        incident_id: str,
+        concurrency: Optional[int] = None,
+        performed_by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        concurrency = concurrency or int(os.getenv("BATCH_DOCUMENT_CONCURRENCY", 8))
+
+        # Claim the pending rows in one statement. Rows a concurrent batch or
+        # a queued job holds are 'queued' or 'processing' and are skipped.
+        documents = await Database.fetch_all(
+            '''UPDATE documents SET metadata = metadata || $2
+               WHERE incident_id = $1
+                 AND (extracted_text IS NULL OR COALESCE(metadata->>'status', '') <> 'completed')
+                 AND COALESCE(metadata->>'status', '') NOT IN ('queued', 'processing')
+               RETURNING *''',
+            incident_id, json.dumps({"status": "processing"})
+        )
+
+        try:
+            return await IncidentBatchProcessor._process_claimed(incident_id, documents, concurrency, performed_by, started)
+        except BaseException as e:
+            # Don't leave claimed rows stuck in 'processing' if the batch aborts
+            # (including the request being cancelled).
+            try:
+                await Database.execute(
+                    '''UPDATE documents SET metadata = metadata || $2
+                       WHERE metadata->>'status' = 'processing' AND id = ANY($1::uuid[])''',
+                    [str(doc["id"]) for doc in documents],
+                    json.dumps({"status": "failed", "error": f"Batch aborted: {e!r}"})
+                )
+            except Exception as reset_error:
+                print(f"Error releasing documents of aborted batch for incident {incident_id}: {reset_error}")
+            raise
+
+    @staticmethod
+    async def _process_claimed(
+        incident_id: str,
+        documents,
+        concurrency: int,
+        performed_by: Optional[str],
+        started: float
+    ) -> Dict[str, Any]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(doc):
+            async with semaphore:
+                doc_started = time.perf_counter()
+                try:
+                    result = await DocumentPipeline.run(doc, doc["file_type"])
+                    result["elapsed_ms"] = round((time.perf_counter() - doc_started) * 1000, 2)
+                    return result
+                except Exception as e:
+                    print(f"Error processing document {doc['id']}: {e}")
+                    return {"document_id": str(doc["id"]), "error": str(e)}
+
+        results = await asyncio.gather(*(run_one(doc) for doc in documents))
+
+        completed = [r for r in results if "error" not in r]
+        failed = [r for r in results if "error" in r]
+
+        await DocumentPipeline.save_results(completed)
+        if failed:
+            await Database.execute_many(
+                'UPDATE documents SET metadata = metadata || $1 WHERE id = $2',
+                [(json.dumps({"status": "failed", "error": r["error"]}), r["document_id"]) for r in failed]
+            )
+        for r in completed:
+            await AuditLog.record(
+                incident_id, "DOCUMENT_PROCESSED",
+                {"batch": True, "status": r["metadata"]["status"], "ocr_text_length": len(r["ocr_text"])},
+                "document", r["document_id"], performed_by
+            )
+        for r in failed:
+            await AuditLog.record(
+                incident_id, "DOCUMENT_PROCESSING_FAILED", {"batch": True, "error": r["error"]},
+                "document", r["document_id"], performed_by
+            )
+        # Summarizing runs after the response; the digests are ready for later analyses.
+        DocumentDigestService.schedule_documents([r["document_id"] for r in completed])
+
+        return {
+            "incident_id": incident_id,
+            "total": len(documents),
+            "completed": len(completed),
+            "failed": len(failed),
+            "partial": sum(1 for r in completed if r["metadata"]["status"] == "partial"),
+            "cache_hits": sum(1 for r in completed if r["metadata"].get("cache_hit")),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "slowest_document_ms": max((r["elapsed_ms"] for r in completed), default=0.0),
+            "documents": [
+                {
+                    "document_id": r["document_id"],
+                    "status": r["metadata"]["status"],
+                    "ocr_text_length": len(r["ocr_text"]),
+                    "ai_description": r["ai_description"],
+                    "elapsed_ms": r["elapsed_ms"],
+                }
+                for r in completed
+            ] + [
+                {"document_id": r["document_id"], "status": "failed", "error": r["error"]}
+                for r in failed
+            ],
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import os
+from typing import Dict, List, Optional, Set
+
+from utils.database import Database
+from services.ai_service import AIService
+from services.document_pipeline import AI_DESCRIPTION_FALLBACK, load_metadata
+from services.document_processor import PDF_LIMITED_RESULTS_TEXT
+from services.prompt_budget import TokenCounter
+
+PLACEHOLDER_TEXTS = {"", "processing", PDF_LIMITED_RESULTS_TEXT}
+
+def document_source_text(doc) -> str:
+    """The text a document contributes to the digest: extracted text plus the image description."""
+    text = (doc["extracted_text"] or "").strip()
+    if text in PLACEHOLDER_TEXTS:
+        text = ""
+
+    description = load_metadata(doc["metadata"]).get("ai_description") or ""
+    if description and description != AI_DESCRIPTION_FALLBACK and not description.startswith("PDF document"):
+        text = f"{text}\n\nImage description: {description}".strip()
+    return text
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """Split on paragraph boundaries into pieces of at most ``max_tokens``."""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        if not paragraph:
+            continue
+        tokens = TokenCounter.count(paragraph)
+        if tokens > max_tokens:
+            # One huge paragraph (typical of OCR output): cut it by size.
+            step = max_tokens * 4
+            pieces = [paragraph[i:i + step] for i in range(0, len(paragraph), step)]
+        else:
+            pieces = [paragraph]
+
+        for piece in pieces:
+            piece_tokens = TokenCounter.count(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class DocumentDigestService:
+    """Map-reduce digests of extracted document text.
+
+    Each document's text is chunked, the chunks are summarized concurrently
+    and the summaries are reduced to a short per-document digest, stored in
+    ``document_digests`` with the hash of the text it was built from. The
+    per-incident digest in ``incident_digests`` combines the document
+    digests. Both are rebuilt when documents finish processing, so the
+    analysis and report endpoints only read a stored row. When that row is
+    missing they fall back to raw excerpts and ``schedule_incident`` builds
+    it in the background; no summarization runs on a request path.
+    """
+
+    _background: Set[asyncio.Task] = set()
+    _scheduled_incidents: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _limits() -> Dict[str, int]:
+        return {
+            "chunk": int(os.getenv("DIGEST_CHUNK_TOKENS", 1500)),
+            "document": int(os.getenv("DIGEST_DOCUMENT_TOKENS", 300)),
+            "incident": int(os.getenv("DIGEST_INCIDENT_TOKENS", 800)),
+        }
+
+    @staticmethod
+    async def _reduce(texts: List[str], purpose: str, max_tokens: int) -> str:
+        combined = "\n\n".join(texts)
+        if TokenCounter.count(combined) <= max_tokens:
+            return combined
+        return await AIService.summarize_evidence(combined, purpose, max_tokens)
+
+    @staticmethod
+    async def build_document_digest(doc) -> Optional[str]:
+        """Compute and store the digest for one ``documents`` row; None if it has no text."""
+        text = document_source_text(doc)
+        if not text:
+            return None
+
+        source_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        existing = await Database.fetch_one(
+            'SELECT digest FROM document_digests WHERE document_id = $1 AND source_hash = $2',
+            doc["id"], source_hash
+        )
+        if existing:
+            return existing["digest"]
+
+        limits = DocumentDigestService._limits()
+        chunks = split_into_chunks(text, limits["chunk"])
+        if len(chunks) == 1 and TokenCounter.count(chunks[0]) <= limits["document"]:
+            summaries = chunks
+        else:
+            summaries = await asyncio.gather(*[
+                AIService.summarize_evidence(chunk, f"excerpt of the document '{doc['filename']}'", limits["document"])
+                for chunk in chunks
+            ])
+        digest = await DocumentDigestService._reduce(
+            [s for s in summaries if s], f"summaries of the document '{doc['filename']}'", limits["document"]
+        )
+
+        await Database.execute(
+            '''INSERT INTO document_digests (document_id, incident_id, source_hash, digest, chunk_count)
+               VALUES ($1, $2, $3, $4, $5)
+               ON CONFLICT (document_id) DO UPDATE
+               SET source_hash = EXCLUDED.source_hash, digest = EXCLUDED.digest,
+                   chunk_count = EXCLUDED.chunk_count, updated_at = now()''',
+            doc["id"], doc["incident_id"], source_hash, digest, len(chunks)
+        )
+        return digest
+
+    @staticmethod
+    async def refresh_documents(document_ids: List[str]):
+        """Rebuild the digests of freshly processed documents and of their incidents. Never raises."""
+        if not document_ids:
+            return
+        try:
+            docs = await Database.fetch_all('SELECT * FROM documents WHERE id = ANY($1::uuid[])', document_ids)
+        except Exception as e:
+            print(f"Error loading documents for digest refresh: {e}")
+            return
+
+        results = await asyncio.gather(
+            *[DocumentDigestService.build_document_digest(doc) for doc in docs], return_exceptions=True
+        )
+        for doc, result in zip(docs, results):
+            if isinstance(result, Exception):
+                print(f"Error building digest for document {doc['id']}: {result}")
+
+        for incident_id in {doc["incident_id"] for doc in docs}:
+            await DocumentDigestService.refresh_incident(incident_id)
+
+    @staticmethod
+    async def _build_incident_digest(incident_id) -> Optional[str]:
+        docs = await Database.fetch_all(
+            'SELECT * FROM documents WHERE incident_id = $1 ORDER BY created_at, id',
+            incident_id
+        )
+        digests = await asyncio.gather(*[DocumentDigestService.build_document_digest(doc) for doc in docs])
+        parts = [f"[{doc['filename']}] {digest}" for doc, digest in zip(docs, digests) if digest]
+        if not parts:
+            await Database.execute('DELETE FROM incident_digests WHERE incident_id = $1', incident_id)
+            return None
+
+        # Reprocessing a document often yields the same text; skip the reduce then.
+        fingerprint = hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+        existing = await Database.fetch_one(
+            'SELECT digest FROM incident_digests WHERE incident_id = $1 AND source_hash = $2',
+            incident_id, fingerprint
+        )
+        if existing:
+            return existing["digest"]
+
+        digest = await DocumentDigestService._reduce(
+            parts, "document summaries of one incident", DocumentDigestService._limits()["incident"]
+        )
+        await Database.execute(
+            '''INSERT INTO incident_digests (incident_id, source_hash, digest, document_count)
+               VALUES ($1, $2, $3, $4)
+               ON CONFLICT (incident_id) DO UPDATE
+               SET source_hash = EXCLUDED.source_hash, digest = EXCLUDED.digest,
+                   document_count = EXCLUDED.document_count, updated_at = now()''',
+            incident_id, fingerprint, digest, len(parts)
+        )
+        return digest
+
+    @staticmethod
+    async def refresh_incident(incident_id) -> Optional[str]:
+        """Rebuild the incident digest after one of its documents was (re)processed."""
+        try:
+            return await DocumentDigestService._build_incident_digest(incident_id)
+        except Exception as e:
+            print(f"Error building document digest for incident {incident_id}: {e}")
+            try:
+                # Drop the stale digest so the next reader rebuilds it.
+                await Database.execute('DELETE FROM incident_digests WHERE incident_id = $1', incident_id)
+            except Exception:
+                pass
+            return None
+
+    @staticmethod
+    async def get_incident_digest(incident_id) -> Optional[str]:
+        """The incident's stored document digest; None if it has not been built."""
+        row = await Database.fetch_one(
+            'SELECT digest FROM incident_digests WHERE incident_id = $1',
+            incident_id
+        )
+        return row["digest"] if row else None
+
+    @classmethod
+    def _spawn(cls, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        cls._background.add(task)
+        task.add_done_callback(cls._background.discard)
+        return task
+
+    @classmethod
+    def schedule_incident(cls, incident_id):
+        """Build the incident digest in the background, once per incident at a time."""
+        key = str(incident_id)
+        if key in cls._scheduled_incidents:
+            return
+        task = cls._spawn(cls.refresh_incident(incident_id))
+        cls._scheduled_incidents[key] = task
+        task.add_done_callback(lambda done: cls._scheduled_incidents.pop(key, None))
+
+    @classmethod
+    def schedule_documents(cls, document_ids: List[str]):
+        """refresh_documents in the background, for callers answering an HTTP request."""
+        if document_ids:
+            cls._spawn(cls.refresh_documents(document_ids))
+
+    @classmethod
+    async def wait_for_background(cls, timeout: float = 30):
+        """Let scheduled digest builds finish on shutdown, then cancel the rest."""
+        if cls._background:
+            _, pending = await asyncio.wait(set(cls._background), timeout=timeout)
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.database import Database
+from utils.async_storage import AsyncStorageClient
+from services.document_processor import DocumentProcessor, PDF_LIMITED_RESULTS_TEXT
+from services.processing_pool import ProcessingPool, JobTimeoutError
+from services.pdf_extraction import PdfExtractionEngine
+from services.extraction_cache import ExtractionCache
+from services.llm_client import LLMClient
+
+ProgressCallback = Callable[[str], Awaitable[None]]
+
+SAVE_RESULT_QUERY = 'UPDATE documents SET extracted_text = $1, metadata = metadata || $2 WHERE id = $3'
+
+
+class DocumentNotFoundError(Exception):
+    pass
+
+
+def load_metadata(value) -> dict:
+    if not value:
+        return {}
+    if isinstance(value, str):
+        return json.loads(value)
+    return dict(value)
+
+async def get_cached_results(content_hash: Optional[str], file_type: str) -> dict:
+    if not content_hash:
+        return {}
+
+    kinds = [ExtractionCache.OCR_TEXT]
+    if file_type.startswith("image/"):
+        kinds.append(ExtractionCache.AI_DESCRIPTION)
+
+    # Each kind is looked up on its own, so whatever is cached gets used even
+    # when another kind is missing (e.g. OCR failed but the description did not).
+    cached = {}
+    for kind in kinds:
+        value = await ExtractionCache.get(content_hash, kind)
+        if value is not None:
+            cached[kind] = value
+    return cached
+
+def is_cacheable_pdf_text(text: str, extraction: Dict[str, Any]) -> bool:
+    # The placeholder and text with errored pages mean extraction failed;
+    # caching them would pin the failure to the content hash.
+    return text != PDF_LIMITED_RESULTS_TEXT and not extraction["status_counts"].get("error")
+
+def has_all_results(cached: dict, file_type: str) -> bool:
+    if file_type.startswith("image/"):
+        return ExtractionCache.OCR_TEXT in cached and ExtractionCache.AI_DESCRIPTION in cached
+    if file_type == "application/pdf":
+        return ExtractionCache.OCR_TEXT in cached
+    return False
+
+AI_DESCRIPTION_FALLBACK = "Image uploaded successfully. OCR text extraction completed."
+
+class AIDescriptionError(Exception):
+    pass
+
+async def get_ai_description(file_data: bytes, file_type: str, content_hash: Optional[str] = None) -> str:
+    """Describe an image with the vision model; raises AIDescriptionError on failure."""
+    if not LLMClient.available():
+        return AI_DESCRIPTION_FALLBACK
+
+    from services.ai_service import AIService, IMAGE_DESCRIPTION_FALLBACKS
+    description = await AIService.generate_image_description(file_data, file_type)
+    if description in IMAGE_DESCRIPTION_FALLBACKS:
+        raise AIDescriptionError(description)
+
+    if content_hash:
+        await ExtractionCache.set(content_hash, ExtractionCache.AI_DESCRIPTION, description)
+    return description
+
+async def extract_image_text(ocr_source, content_hash: str) -> str:
+    ocr_text = await ProcessingPool.run(
+        DocumentProcessor.ocr_image, ocr_source,
+        timeout=float(os.getenv("OCR_TIMEOUT", os.getenv("DOC_POOL_JOB_TIMEOUT", 120)))
+    )
+    # OCR failures raise OCRError, so empty text here means the image has no
+    # text (most site photos) and is as cacheable as any other result.
+    await ExtractionCache.set(content_hash, ExtractionCache.OCR_TEXT, ocr_text)
+    return ocr_text
+
+
+class DocumentPipeline:
+    """Download, extract and describe one document.
+
+    ``run`` computes the result for a ``documents`` row without writing it;
+    ``process`` claims the row, runs it and saves the result.
+    """
+
+    @staticmethod
+    async def run(doc_data, file_type: str, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        async def report(stage: str):
+            if progress is not None:
+                await progress(stage)
+
+        document_id = str(doc_data["id"])
+        download = None
+
+        try:
+            # A document that was processed before carries its content hash, so a
+            # full cache hit skips the storage download as well as OCR and the LLM.
+            # The hash is only trusted while the object's ETag is unchanged.
+            stored = load_metadata(doc_data["metadata"])
+            content_hash = stored.get("content_hash")
+            object_etag = None
+            if content_hash:
+                object_etag = await AsyncStorageClient.get_etag(doc_data["storage_path"])
+                if object_etag is None or object_etag != stored.get("object_etag"):
+                    content_hash = None
+            cached = await get_cached_results(content_hash, file_type)
+
+            if not has_all_results(cached, file_type):
+                await report("downloading")
+                if object_etag is None:
+                    # Taken before the download: if the object changes in between,
+                    # the stale ETag only costs a re-download next time.
+                    object_etag = await AsyncStorageClient.get_etag(doc_data["storage_path"])
+                # Large objects are spooled to a temp file; the extractors read the
+                # file directly and worker processes receive only its path.
+                download = await AsyncStorageClient.download_spooled(doc_data["storage_path"])
+
+                if not download.size:
+                    raise DocumentNotFoundError("File not found in storage")
+
+                file_hash = await asyncio.to_thread(download.sha256)
+                if file_hash != content_hash:
+                    content_hash = file_hash
+                    cached = await get_cached_results(content_hash, file_type)
+
+            ocr_text = cached.get(ExtractionCache.OCR_TEXT, "")
+            ai_description = cached.get(ExtractionCache.AI_DESCRIPTION, "")
+            metadata = {
+                "content_hash": content_hash,
+                "object_etag": object_etag,
+                "cache_hit": has_all_results(cached, file_type),
+            }
+            extraction = None
+
+            if file_type.startswith("image/"):
+                if not has_all_results(cached, file_type):
+                    await report("normalizing")
+                    # Decode, rotate and downscale once; OCR and the vision model
+                    # each get their own compact variant of the image.
+                    normalized = await ProcessingPool.run(DocumentProcessor.normalize_image, download.source)
+                    if normalized:
+                        ocr_source = normalized["ocr_image"]
+                        llm_image, llm_content_type = normalized["llm_image"], normalized["llm_content_type"]
+                        extraction = {"image_normalization": normalized["stats"]}
+                        metadata["image_normalization"] = normalized["stats"]
+                    else:
+                        ocr_source = download.source
+                        llm_image, llm_content_type = download.read_bytes(), file_type
+
+                # OCR (local CPU) and the vision call (remote I/O) are independent,
+                # so they run side by side with their own timeouts. If only one
+                # of them fails the document is saved as partially complete.
+                stages = {}
+                if ExtractionCache.OCR_TEXT not in cached:
+                    stages["ocr_text"] = extract_image_text(ocr_source, content_hash)
+                if ExtractionCache.AI_DESCRIPTION not in cached:
+                    stages["ai_description"] = asyncio.wait_for(
+                        get_ai_description(llm_image, llm_content_type, content_hash),
+                        timeout=float(os.getenv("AI_DESCRIPTION_TIMEOUT", 45))
+                    )
+
+                if stages:
+                    await report("extracting")
+                    outcomes = dict(zip(stages, await asyncio.gather(*stages.values(), return_exceptions=True)))
+                    failures = {name: outcome for name, outcome in outcomes.items() if isinstance(outcome, Exception)}
+
+                    # Nothing usable at all: let the caller mark the document failed.
+                    if len(failures) == 2:
+                        raise failures["ocr_text"]
+
+                    if "ocr_text" in outcomes and "ocr_text" not in failures:
+                        ocr_text = outcomes["ocr_text"]
+                    if "ai_description" in outcomes:
+                        ai_description = AI_DESCRIPTION_FALLBACK if "ai_description" in failures else outcomes["ai_description"]
+
+                    if failures:
+                        for name, error in failures.items():
+                            print(f"{name} failed for document {document_id}: {error!r}")
+                        metadata["partial"] = {
+                            name: "timeout" if isinstance(error, (asyncio.TimeoutError, JobTimeoutError)) else str(error)
+                            for name, error in failures.items()
+                        }
+            elif file_type == "application/pdf":
+                if ExtractionCache.OCR_TEXT not in cached:
+                    await report("extracting")
+                    result = await PdfExtractionEngine.extract(download.source)
+                    ocr_text = result["text"]
+                    extraction = PdfExtractionEngine.summarize(result)
+                    metadata["pdf_extraction"] = extraction
+                    if is_cacheable_pdf_text(ocr_text, extraction):
+                        await ExtractionCache.set(content_hash, ExtractionCache.OCR_TEXT, ocr_text)
+                ai_description = "PDF document processed for text extraction"
+
+            metadata.update({
+                "ai_description": ai_description,
+                "status": "partial" if metadata.get("partial") else "completed"
+            })
+            return {
+                "document_id": document_id,
+                "incident_id": str(doc_data["incident_id"]),
+                "ocr_text": ocr_text,
+                "ai_description": ai_description,
+                "extraction": extraction,
+                "metadata": metadata,
+            }
+        finally:
+            if download is not None:
+                download.cleanup()
+
+    @staticmethod
+    async def save_results(results: List[Dict[str, Any]]):
+        if results:
+            await Database.execute_many(
+                SAVE_RESULT_QUERY,
+                [(r["ocr_text"], json.dumps(r["metadata"]), r["document_id"]) for r in results]
+            )
+
+    @staticmethod
+    async def mark_status(document_id: str, status: str, **details):
+        # Also clears the 'processing' placeholder ``process`` leaves in extracted_text.
+        await Database.execute(
+            '''UPDATE documents SET extracted_text = NULLIF(extracted_text, 'processing'), metadata = metadata || $1
+               WHERE id = $2''',
+            json.dumps({"status": status, **details}),
+            document_id
+        )
+
+    @staticmethod
+    async def process(document_id: str, file_type: str, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        doc_data = await Database.fetch_one(
+            '''UPDATE documents SET extracted_text = $1, metadata = metadata || $2
+               WHERE id = $3 RETURNING *''',
+            'processing', json.dumps({"status": "processing"}), document_id
+        )
+
+        if not doc_data:
+            raise DocumentNotFoundError("Document not found")
+
+        result = await DocumentPipeline.run(doc_data, file_type, progress)
+
+        if progress is not None:
+            await progress("saving")
+        await Database.execute(SAVE_RESULT_QUERY, result["ocr_text"], json.dumps(result["metadata"]), document_id)
+        return result
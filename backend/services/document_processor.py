@@ -1,62 +1,314 @@
+import importlib.util
 import io
-from PIL import Image
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from PIL import Image, ImageOps
 import pytesseract
 import PyPDF2
 import pdfplumber
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+PDF_LIMITED_RESULTS_TEXT = "PDF uploaded successfully. Text extraction completed with limited results. Document is available for manual review if needed."
+
+# Extractors take either the file bytes or the path of a spooled download.
+Source = Union[bytes, str]
+
+class OCRError(Exception):
+    """OCR failed; raised with a plain message so it pickles back from pool workers."""
+    pass
+
+def open_source(source: Source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+class OCRBackend(ABC):
+    """Turns a PIL image into text. One instance lives for the whole process."""
+
+    name = "base"
+
+    def __init__(self, lang: str, psm: int):
+        self.lang = lang
+        self.psm = psm
+
+    @abstractmethod
+    def image_to_string(self, image: Image.Image) -> str:
+        ...
+
+
+class PytesseractBackend(OCRBackend):
+    """Forks the ``tesseract`` binary per image; works wherever the CLI is installed."""
+
+    name = "pytesseract"
+
+    def image_to_string(self, image: Image.Image) -> str:
+        return pytesseract.image_to_string(image, lang=self.lang, config=f"--psm {self.psm}")
+
+
+class TesserocrBackend(OCRBackend):
+    """Keeps a libtesseract handle open so traineddata is loaded only once."""
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str, psm: int):
+        super().__init__(lang, psm)
+        import tesserocr
+
+        self._api = tesserocr.PyTessBaseAPI(lang=lang, psm=tesserocr.PSM(psm))
+        self._lock = threading.Lock()
+
+    def image_to_string(self, image: Image.Image) -> str:
+        with self._lock:
+            self._api.SetImage(image)
+            try:
+                return self._api.GetUTF8Text()
+            finally:
+                self._api.Clear()
+
+
+OCR_BACKENDS = ("auto", "tesserocr", "pytesseract")
+
+_ocr_backend: Optional[OCRBackend] = None
+
+def check_ocr_backend() -> str:
+    """Validate OCR_BACKEND in the API process, before any pool worker starts.
+
+    Raises if the value is unknown or names tesserocr when it is not
+    installed, instead of every OCR call failing later inside a worker.
+    """
+    backend = os.getenv("OCR_BACKEND", "auto").lower()
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"OCR_BACKEND must be one of {', '.join(OCR_BACKENDS)}, got {backend!r}")
+    if backend == "tesserocr" and importlib.util.find_spec("tesserocr") is None:
+        raise RuntimeError("OCR_BACKEND=tesserocr but the tesserocr module is not installed")
+    return backend
+
+def get_ocr_backend() -> OCRBackend:
+    """Return this process's OCR engine, creating it on first use.
+
+    OCR_BACKEND is ``tesserocr``, ``pytesseract`` or ``auto`` (tesserocr when
+    it is installed). Pool workers are long-lived, so each one pays the
+    engine start-up cost once instead of on every image.
+    """
+    global _ocr_backend
+    if _ocr_backend is None:
+        backend = check_ocr_backend()
+        lang = os.getenv("OCR_LANG", "eng")
+        psm = int(os.getenv("OCR_PSM", 3))
+
+        if backend in ("auto", "tesserocr"):
+            try:
+                _ocr_backend = TesserocrBackend(lang, psm)
+            except Exception as e:
+                if backend == "tesserocr":
+                    raise
+                print(f"tesserocr unavailable, falling back to pytesseract: {e}")
+        if _ocr_backend is None:
+            _ocr_backend = PytesseractBackend(lang, psm)
+    return _ocr_backend
 
 class DocumentProcessor:
     @staticmethod
-    def extract_text_from_image(image_data: bytes) -> str:
+    def normalize_image(
+        image_data: Source,
+        ocr_max_edge: Optional[int] = None,
+        llm_max_edge: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Decode an upload once and derive the OCR and vision-model variants.
+
+        JPEGs are decoded in draft mode straight at reduced size, EXIF rotation
+        is applied, the OCR variant is grayscale (optionally binarized) PNG and
+        the LLM variant is a compact JPEG/WebP. Returns None if the image
+        cannot be decoded, in which case callers use the original bytes.
+        """
+        ocr_max_edge = ocr_max_edge or int(os.getenv("IMAGE_OCR_MAX_EDGE", 2500))
+        llm_max_edge = llm_max_edge or int(os.getenv("IMAGE_LLM_MAX_EDGE", 1536))
+        llm_format = os.getenv("IMAGE_LLM_FORMAT", "jpeg").lower()
+        llm_quality = int(os.getenv("IMAGE_LLM_QUALITY", 80))
+        binarize_threshold = os.getenv("IMAGE_OCR_BINARIZE_THRESHOLD")
+        started = time.perf_counter()
+
         try:
-            image = Image.open(io.BytesIO(image_data))
+            original_bytes = len(image_data) if isinstance(image_data, (bytes, bytearray)) else os.path.getsize(image_data)
+            image = Image.open(open_source(image_data))
+            original_size = image.size
 
-            text = pytesseract.image_to_string(image)
+            if image.format == "JPEG":
+                # Let libjpeg scale by 1/2, 1/4 or 1/8 while decoding.
+                image.draft("RGB", (ocr_max_edge, ocr_max_edge))
+
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.thumbnail((ocr_max_edge, ocr_max_edge), Image.LANCZOS)
+
+            ocr_image = ImageOps.autocontrast(image.convert("L"))
+            if binarize_threshold:
+                threshold = int(binarize_threshold)
+                ocr_image = ocr_image.point(lambda value: 255 if value > threshold else 0, mode="1")
+            ocr_buffer = io.BytesIO()
+            ocr_image.save(ocr_buffer, format="PNG", compress_level=1)
+
+            llm_image = image.copy()
+            llm_image.thumbnail((llm_max_edge, llm_max_edge), Image.LANCZOS)
+            llm_buffer = io.BytesIO()
+            if llm_format == "webp":
+                llm_image.save(llm_buffer, format="WEBP", quality=llm_quality)
+                llm_content_type = "image/webp"
+            else:
+                llm_image.convert("RGB").save(llm_buffer, format="JPEG", quality=llm_quality, optimize=True)
+                llm_content_type = "image/jpeg"
+
+            llm_bytes = llm_buffer.getvalue()
+            return {
+                "ocr_image": ocr_buffer.getvalue(),
+                "llm_image": llm_bytes,
+                "llm_content_type": llm_content_type,
+                "stats": {
+                    "original_size": list(original_size),
+                    "ocr_size": list(ocr_image.size),
+                    "llm_size": list(llm_image.size),
+                    "original_bytes": original_bytes,
+                    "llm_bytes": len(llm_bytes),
+                    "bytes_saved": max(0, original_bytes - len(llm_bytes)),
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                },
+            }
+        except Exception as e:
+            print(f"Error normalizing image: {e}")
+            return None
+
+    @staticmethod
+    def ocr_image(image_data: Source) -> str:
+        """OCR an image, raising OCRError instead of returning "" on failure."""
+        try:
+            image = Image.open(open_source(image_data))
+
+            text = get_ocr_backend().image_to_string(image)
 
             return text.strip()
         except Exception as e:
+            raise OCRError(f"{type(e).__name__}: {e}")
+
+    @staticmethod
+    def extract_text_from_image(image_data: Source) -> str:
+        try:
+            return DocumentProcessor.ocr_image(image_data)
+        except OCRError as e:
             print(f"Error extracting text from image: {e}")
             return ""
 
     @staticmethod
-    def extract_text_from_pdf(pdf_data: bytes) -> str:
-        extracted_text = ""
-
+    def count_pdf_pages(pdf_data: Source) -> int:
         try:
-            with pdfplumber.open(io.BytesIO(pdf_data)) as pdf:
-                text_parts = []
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_parts.append(page_text)
-
-                if text_parts:
-                    extracted_text = "\n\n".join(text_parts)
+            return len(PyPDF2.PdfReader(open_source(pdf_data)).pages)
         except Exception as e:
-            print(f"pdfplumber extraction failed: {e}")
+            print(f"Could not count PDF pages: {e}")
+            return 0
 
-        if not extracted_text or len(extracted_text.strip()) < 50:
-            try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_data))
-                text_parts = []
+    @staticmethod
+    def extract_pdf_page_range(
+        pdf_data: Source,
+        first_page: int = 0,
+        last_page: Optional[int] = None,
+        max_chars: Optional[int] = None,
+        ocr_image_pages: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        """Extract pages [first_page, last_page) with one pdfplumber parse.
 
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_parts.append(page_text)
+        ``last_page`` defaults to the end of the document.
 
-                if text_parts:
-                    extracted_text = "\n\n".join(text_parts)
+        Each page is classified as ``text``, ``image_only`` or ``empty``. Only
+        pages pdfplumber could not read are retried with PyPDF2, and image-only
+        pages are rendered and OCR'd. Stops early once ``max_chars`` is reached.
+        """
+        if ocr_image_pages is None:
+            ocr_image_pages = os.getenv("PDF_OCR_IMAGE_PAGES", "true").lower() == "true"
+
+        results: List[Dict[str, Any]] = []
+        fallback_pages: List[Dict[str, Any]] = []
+        total_chars = 0
+
+        try:
+            with pdfplumber.open(open_source(pdf_data)) as pdf:
+                end = len(pdf.pages) if last_page is None else min(last_page, len(pdf.pages))
+                for index in range(first_page, end):
+                    started = time.perf_counter()
+                    page_result = {"page": index + 1, "text": "", "status": "empty", "method": None}
+
+                    try:
+                        page = pdf.pages[index]
+                        page_text = (page.extract_text() or "").strip()
+
+                        if page_text:
+                            page_result.update(text=page_text, status="text", method="pdfplumber")
+                        elif page.images:
+                            page_result["status"] = "image_only"
+                            if ocr_image_pages:
+                                rendered = page.to_image(resolution=200).original
+                                page_result["text"] = get_ocr_backend().image_to_string(rendered).strip()
+                                page_result["method"] = "ocr"
+                        else:
+                            fallback_pages.append(page_result)
+                        page.close()
+                    except Exception as e:
+                        print(f"pdfplumber extraction failed on page {index + 1}: {e}")
+                        page_result["status"] = "error"
+                        fallback_pages.append(page_result)
+
+                    page_result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                    results.append(page_result)
+                    total_chars += len(page_result["text"])
+
+                    if max_chars is not None and total_chars >= max_chars:
+                        break
+        except Exception as e:
+            print(f"pdfplumber could not open PDF: {e}")
+            page_count = DocumentProcessor.count_pdf_pages(pdf_data)
+            end = page_count if last_page is None else min(last_page, page_count)
+            results = [
+                {"page": index + 1, "text": "", "status": "error", "method": None, "elapsed_ms": 0.0}
+                for index in range(first_page, end)
+            ]
+            fallback_pages = list(results)
+
+        if fallback_pages:
+            try:
+                pdf_reader = PyPDF2.PdfReader(open_source(pdf_data))
+                for page_result in fallback_pages:
+                    if page_result["page"] > len(pdf_reader.pages):
+                        continue
+                    started = time.perf_counter()
+                    try:
+                        page_text = (pdf_reader.pages[page_result["page"] - 1].extract_text() or "").strip()
+                        if page_text:
+                            page_result.update(text=page_text, status="text", method="pypdf2")
+                        elif page_result["status"] == "error":
+                            page_result["status"] = "empty"
+                    except Exception as e:
+                        print(f"PyPDF2 extraction failed on page {page_result['page']}: {e}")
+                    page_result["elapsed_ms"] += round((time.perf_counter() - started) * 1000, 2)
             except Exception as e:
                 print(f"PyPDF2 extraction failed: {e}")
 
+        return results
+
+    @staticmethod
+    def join_pdf_pages(pages: List[Dict[str, Any]]) -> str:
+        extracted_text = "\n\n".join(p["text"] for p in pages if p.get("text"))
+
         if not extracted_text or len(extracted_text.strip()) < 20:
-            return "PDF uploaded successfully. Text extraction completed with limited results. Document is available for manual review if needed."
+            return PDF_LIMITED_RESULTS_TEXT
 
         return extracted_text.strip()
 
     @staticmethod
-    def process_document(file_data: bytes, file_type: str) -> Tuple[str, str]:
+    def extract_text_from_pdf(pdf_data: Source) -> str:
+        pages = DocumentProcessor.extract_pdf_page_range(pdf_data)
+        return DocumentProcessor.join_pdf_pages(pages)
+
+    @staticmethod
+    def process_document(file_data: Source, file_type: str) -> Tuple[str, str]:
         ocr_text = ""
 
         if file_type.startswith("image/"):
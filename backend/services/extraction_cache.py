@@ -0,0 +1,86 @@
+import os
+from typing import Dict, Optional
+
+from utils.database import Database
+from utils.lru_cache import LRUCache
+
+
+class ExtractionCache:
+    """Content-addressed cache for OCR text and AI image descriptions.
+
+    Entries are keyed by (SHA-256 of the file bytes, kind). Lookups go to an
+    in-process LRU first and then to the ``extraction_cache`` table, so a file
+    uploaded to several incidents is only processed once.
+    """
+
+    OCR_TEXT = "ocr_text"
+    AI_DESCRIPTION = "ai_description"
+
+    _memory: Optional[LRUCache] = None
+    _counters: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def _get_memory(cls) -> LRUCache:
+        if cls._memory is None:
+            cls._memory = LRUCache(max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", 1024)))
+        return cls._memory
+
+    @classmethod
+    def _count(cls, kind: str, outcome: str):
+        counters = cls._counters.setdefault(kind, {"memory_hits": 0, "db_hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+    @classmethod
+    async def get(cls, content_hash: str, kind: str) -> Optional[str]:
+        memory = cls._get_memory()
+        value = memory.get((content_hash, kind))
+        if value is not None:
+            cls._count(kind, "memory_hits")
+            return value
+
+        try:
+            row = await Database.fetch_one(
+                'SELECT content FROM extraction_cache WHERE content_hash = $1 AND kind = $2',
+                content_hash, kind
+            )
+        except Exception as e:
+            print(f"Extraction cache lookup failed: {e}")
+            row = None
+
+        if row is None:
+            cls._count(kind, "misses")
+            return None
+
+        cls._count(kind, "db_hits")
+        memory.set((content_hash, kind), row["content"])
+        return row["content"]
+
+    @classmethod
+    async def set(cls, content_hash: str, kind: str, content: str):
+        cls._get_memory().set((content_hash, kind), content)
+
+        try:
+            await Database.execute(
+                '''INSERT INTO extraction_cache (content_hash, kind, content)
+                   VALUES ($1, $2, $3)
+                   ON CONFLICT (content_hash, kind) DO UPDATE SET content = EXCLUDED.content''',
+                content_hash, kind, content
+            )
+        except Exception as e:
+            print(f"Extraction cache write failed: {e}")
+
+    @classmethod
+    def stats(cls) -> dict:
+        memory = cls._get_memory()
+        kinds = {}
+        for kind, counters in cls._counters.items():
+            lookups = sum(counters.values())
+            hits = counters["memory_hits"] + counters["db_hits"]
+            kinds[kind] = {**counters, "hit_ratio": round(hits / lookups, 4) if lookups else 0.0}
+
+        return {
+            "memory_entries": len(memory),
+            "memory_max_entries": memory.max_entries,
+            "memory_evictions": memory.evictions,
+            "kinds": kinds,
+        }
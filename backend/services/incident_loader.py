@@ -0,0 +1,88 @@
+import json
+from typing import Any, Dict, Optional, Sequence
+
+from utils.database import Database
+
+# Incident columns the prompts and routers read. Columns are picked out of
+# to_jsonb(row) so a deployment missing one of them still loads.
+INCIDENT_FIELDS = (
+    "id", "title", "description", "severity", "location", "incident_date", "occurred_at",
+    "status", "investigation_status",
+)
+
+CHILD_QUERIES = {
+    "witnesses": '''SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                        'name', to_jsonb(w)->>'name',
+                        'statement', COALESCE(to_jsonb(w)->>'statement', to_jsonb(w)->>'testimony'))), '[]'::jsonb) AS items
+                    FROM witnesses w WHERE w.incident_id = i.id''',
+    "documents": '''SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                        'filename', to_jsonb(d)->>'filename',
+                        'extracted_text', to_jsonb(d)->>'extracted_text',
+                        'ocr_text', to_jsonb(d)->>'ocr_text')), '[]'::jsonb) AS items
+                    FROM incident_documents d WHERE d.incident_id = i.id''',
+    "analyses": '''SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                        'id', a.id, 'analysis_type', a.analysis_type, 'findings', a.findings,
+                        'performed_at', a.performed_at) ORDER BY a.performed_at DESC), '[]'::jsonb) AS items
+                   FROM incident_analyses a WHERE a.incident_id = i.id''',
+}
+
+
+class IncidentLoader:
+    """Load an incident and its child collections in one round trip.
+
+    Each requested collection is a ``jsonb_agg`` in a lateral subquery,
+    projected to the fields the prompts use, and the stored document digest
+    comes along from ``incident_digests``. Newest analyses come first.
+    """
+
+    _queries: Dict[tuple, str] = {}
+
+    @classmethod
+    def _query(cls, children: Sequence[str]) -> str:
+        key = tuple(children)
+        if key not in cls._queries:
+            joins = "\n".join(
+                f"CROSS JOIN LATERAL ({CHILD_QUERIES[name]}) AS {name}_agg" for name in key
+            )
+            selected = "".join(f",\n       {name}_agg.items AS {name}" for name in key)
+            cls._queries[key] = f'''SELECT (SELECT jsonb_object_agg(f.key, f.value)
+               FROM jsonb_each(to_jsonb(i)) f WHERE f.key = ANY($2::text[])) AS incident,
+       g.digest AS document_digest{selected}
+FROM incidents i
+LEFT JOIN incident_digests g ON g.incident_id = i.id
+{joins}
+WHERE i.id = $1'''
+        return cls._queries[key]
+
+    @classmethod
+    async def load(
+        cls,
+        incident_id: str,
+        children: Sequence[str] = ("witnesses", "documents"),
+        conn=None
+    ) -> Optional[Dict[str, Any]]:
+        """The incident as a dict with one list per child collection; None if it does not exist.
+
+        Pass ``conn`` to run on a connection the caller already holds.
+        """
+        query = cls._query(children)
+        if conn is not None:
+            row = await conn.fetchrow(query, incident_id, list(INCIDENT_FIELDS))
+        else:
+            row = await Database.fetch_one(query, incident_id, list(INCIDENT_FIELDS))
+        if not row:
+            return None
+
+        incident = json.loads(row["incident"])
+        for name in children:
+            items = json.loads(row[name])
+            if name == "analyses":
+                for item in items:
+                    if isinstance(item.get("findings"), str):
+                        try:
+                            item["findings"] = json.loads(item["findings"])
+                        except ValueError:
+                            pass
+            incident[name] = items
+        incident["document_digest"] = row["document_digest"]
+        return incident
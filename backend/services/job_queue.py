@@ -0,0 +1,296 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import List, Optional
+
+from utils.database import Database
+from services.document_pipeline import DocumentPipeline, DocumentNotFoundError, load_metadata
+from services.document_digest import DocumentDigestService
+from services.audit_log import AuditLog
+from services.processing_pool import PoolSaturatedError
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobConflictError(Exception):
+    pass
+
+
+class JobLockLostError(Exception):
+    pass
+
+
+CLAIM_QUERY = '''
+UPDATE document_jobs
+SET status = 'processing', attempts = attempts + 1, locked_by = $1,
+    locked_at = now(), started_at = COALESCE(started_at, now()), updated_at = now()
+WHERE id = (
+    SELECT id FROM document_jobs
+    WHERE (status = 'queued' AND run_after <= now())
+       OR (status = 'processing' AND locked_at < now() - make_interval(secs => $2)
+           AND attempts < max_attempts)
+    ORDER BY created_at
+    FOR UPDATE SKIP LOCKED
+    LIMIT 1
+)
+RETURNING id, document_id, file_type, attempts, max_attempts, created_by
+'''
+
+# Jobs whose worker died on their last attempt are failed instead of reclaimed.
+FAIL_EXHAUSTED_QUERY = '''
+WITH exhausted AS (
+    UPDATE document_jobs
+    SET status = 'failed', error = 'Worker stopped responding on the final attempt',
+        finished_at = now(), updated_at = now()
+    WHERE status = 'processing' AND attempts >= max_attempts
+      AND locked_at < now() - make_interval(secs => $1)
+    RETURNING document_id, error
+)
+UPDATE documents d
+SET extracted_text = NULLIF(d.extracted_text, 'processing'),
+    metadata = d.metadata || jsonb_build_object('status', 'failed', 'error', e.error)
+FROM exhausted e
+WHERE d.id = e.document_id
+'''
+
+
+class DocumentJobQueue:
+    """Postgres-backed queue for document processing.
+
+    ``enqueue`` inserts a row into ``document_jobs``; worker coroutines started
+    in the app lifespan claim rows with ``FOR UPDATE SKIP LOCKED`` so any
+    number of uvicorn workers can share the queue. A running job refreshes
+    ``locked_at`` every JOB_HEARTBEAT_INTERVAL seconds and on each progress
+    update; jobs whose worker died are reclaimed once their lock is older
+    than JOB_LOCK_TIMEOUT, or failed if that was their last attempt. Every
+    write a worker makes to a job is conditional on it still holding the lock.
+    """
+
+    _workers: List[asyncio.Task] = []
+    _wakeup: Optional[asyncio.Event] = None
+    _worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    @classmethod
+    async def enqueue(cls, document_id: str, file_type: str, created_by: Optional[str] = None):
+        max_queued = int(os.getenv("JOB_MAX_QUEUED", 1000))
+        queued = await Database.fetch_one(
+            "SELECT count(*) AS depth FROM document_jobs WHERE status = 'queued'"
+        )
+        if queued["depth"] >= max_queued:
+            raise QueueFullError(f"Document job queue is full ({queued['depth']} jobs queued)")
+
+        # The document is marked queued in the same statement that inserts the
+        # job, so an incident batch cannot claim it in between. A document that
+        # is queued or processing with no active job row belongs to a batch.
+        # The active job a conflicting insert ran into can finish before the
+        # SELECT sees it, so retry until one of them settles the outcome.
+        for _ in range(5):
+            job_id = str(uuid.uuid4())
+            job = await Database.fetch_one(
+                '''WITH claimed AS (
+                       UPDATE documents SET metadata = metadata || $5
+                       WHERE id = $1 AND COALESCE(metadata->>'status', '') NOT IN ('queued', 'processing')
+                         AND NOT EXISTS (SELECT 1 FROM document_jobs
+                                         WHERE document_id = $1 AND status IN ('queued', 'processing'))
+                       RETURNING id
+                   )
+                   INSERT INTO document_jobs (id, document_id, file_type, max_attempts, created_by)
+                   SELECT $6, id, $2, $3, $4 FROM claimed
+                   ON CONFLICT (document_id) WHERE status IN ('queued', 'processing') DO NOTHING
+                   RETURNING id, status''',
+                document_id, file_type, int(os.getenv("JOB_MAX_ATTEMPTS", 3)), created_by,
+                json.dumps({"status": "queued", "job_id": job_id}), job_id
+            )
+            if job is not None:
+                break
+
+            # The document already has an active job; hand that one back.
+            job = await Database.fetch_one(
+                '''SELECT id, status FROM document_jobs
+                   WHERE document_id = $1 AND status IN ('queued', 'processing')''',
+                document_id
+            )
+            if job is not None:
+                break
+
+            document = await Database.fetch_one('SELECT metadata FROM documents WHERE id = $1', document_id)
+            if document and load_metadata(document["metadata"]).get("status") in ("queued", "processing"):
+                raise JobConflictError("Document is being processed by an incident batch; try again when it finishes")
+        else:
+            raise JobConflictError("Document job changed state while queueing; try again")
+
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+        return job
+
+    @classmethod
+    async def get_job(cls, job_id: str):
+        return await Database.fetch_one(
+            '''SELECT id, document_id, file_type, status, attempts, max_attempts, progress, result,
+                      error, created_at, started_at, finished_at, updated_at
+               FROM document_jobs WHERE id = $1''',
+            job_id
+        )
+
+    @classmethod
+    async def _update_locked(cls, query: str, *args) -> bool:
+        """Run ``query`` (an UPDATE ... SET) on a job this worker holds; ``args`` end with the job id.
+
+        The id and lock conditions are appended; returns False if the lock was lost.
+        """
+        row = await Database.fetch_one(
+            f'''{query}
+                WHERE id = ${len(args)} AND locked_by = ${len(args) + 1} AND status = 'processing'
+                RETURNING id''',
+            *args, cls._worker_id
+        )
+        return row is not None
+
+    @classmethod
+    async def _set_progress(cls, job_id, stage: str):
+        if not await cls._update_locked(
+            'UPDATE document_jobs SET progress = $1, locked_at = now(), updated_at = now()',
+            json.dumps({"stage": stage}), job_id
+        ):
+            raise JobLockLostError(f"Document job {job_id} was reclaimed by another worker")
+
+    @classmethod
+    async def _heartbeat(cls, job_id):
+        interval = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 30))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await cls._update_locked('UPDATE document_jobs SET locked_at = now()', job_id):
+                    print(f"Lost the lock on document job {job_id}")
+                    return
+            except Exception as e:
+                print(f"Error refreshing lock on document job {job_id}: {e}")
+
+    @classmethod
+    async def _run_job(cls, job):
+        job_id = job["id"]
+        document_id = str(job["document_id"])
+
+        async def progress(stage: str):
+            await cls._set_progress(job_id, stage)
+
+        heartbeat = asyncio.create_task(cls._heartbeat(job_id))
+        try:
+            await cls._execute_job(job, job_id, document_id, progress)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    @classmethod
+    async def _execute_job(cls, job, job_id, document_id: str, progress):
+        try:
+            # The "saving" progress update fails if the lock was lost, so a
+            # reclaimed job never writes its result over the new owner's.
+            result = await DocumentPipeline.process(document_id, job["file_type"], progress)
+            summary = {
+                "document_status": result["metadata"]["status"],
+                "ocr_text_length": len(result["ocr_text"]),
+                "ai_description": result["ai_description"],
+                "extraction": result["extraction"],
+            }
+            if not await cls._update_locked(
+                '''UPDATE document_jobs
+                   SET status = 'completed', progress = $1, result = $2, error = NULL,
+                       finished_at = now(), updated_at = now()''',
+                json.dumps({"stage": "completed"}), json.dumps(summary), job_id
+            ):
+                print(f"Document job {job_id} was reclaimed before it completed")
+                return
+            await AuditLog.record(
+                result["incident_id"], "DOCUMENT_PROCESSED",
+                {"job_id": str(job_id), "status": summary["document_status"], "ocr_text_length": summary["ocr_text_length"]},
+                "document", document_id, job["created_by"]
+            )
+            await DocumentDigestService.refresh_documents([document_id])
+        except JobLockLostError as e:
+            print(f"Stopped document job {job_id}: {e}")
+        except PoolSaturatedError as e:
+            # Not the document's fault: put it back without spending an attempt.
+            if await cls._update_locked(
+                '''UPDATE document_jobs
+                   SET status = 'queued', attempts = attempts - 1, error = $1,
+                       run_after = now() + interval '5 seconds', updated_at = now()''',
+                str(e), job_id
+            ):
+                await DocumentPipeline.mark_status(document_id, "queued", job_id=str(job_id))
+        except Exception as e:
+            print(f"Error processing document job {job_id}: {e}")
+            retry = not isinstance(e, DocumentNotFoundError) and job["attempts"] < job["max_attempts"]
+            if not await cls._update_locked(
+                '''UPDATE document_jobs
+                   SET status = $1, error = $2, updated_at = now(),
+                       run_after = now() + make_interval(secs => $3),
+                       finished_at = CASE WHEN $1 = 'failed' THEN now() END''',
+                "queued" if retry else "failed", str(e), float(2 ** job["attempts"] * 5), job_id
+            ):
+                return
+            try:
+                if retry:
+                    await DocumentPipeline.mark_status(document_id, "queued", job_id=str(job_id), error=str(e))
+                else:
+                    await DocumentPipeline.mark_status(document_id, "failed", error=str(e))
+            except Exception:
+                pass
+
+    @classmethod
+    async def _worker_loop(cls):
+        poll_interval = float(os.getenv("JOB_POLL_INTERVAL", 2))
+        lock_timeout = float(os.getenv("JOB_LOCK_TIMEOUT", 600))
+
+        while True:
+            try:
+                await Database.execute(FAIL_EXHAUSTED_QUERY, lock_timeout)
+                job = await Database.fetch_one(CLAIM_QUERY, cls._worker_id, lock_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error claiming document job: {e}")
+                job = None
+
+            if job is not None:
+                try:
+                    await cls._run_job(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Error recording document job {job['id']}: {e}")
+                continue
+
+            cls._wakeup.clear()
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    def start(cls, workers: Optional[int] = None):
+        if cls._workers:
+            return
+        workers = workers if workers is not None else int(os.getenv("JOB_WORKERS", 2))
+        cls._wakeup = asyncio.Event()
+        cls._workers = [asyncio.create_task(cls._worker_loop()) for _ in range(workers)]
+
+    @classmethod
+    async def stop(cls):
+        for task in cls._workers:
+            task.cancel()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
+
+    @classmethod
+    async def stats(cls) -> dict:
+        rows = await Database.fetch_all(
+            'SELECT status, count(*) AS jobs FROM document_jobs GROUP BY status'
+        )
+        return {
+            "workers": len(cls._workers),
+            "jobs": {row["status"]: row["jobs"] for row in rows},
+        }
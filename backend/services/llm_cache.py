@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from utils.database import Database
+from utils.lru_cache import LRUCache
+from services.llm_client import LLMClient
+
+
+class LLMCache:
+    """Response cache for chat completions.
+
+    Entries are keyed by a SHA-256 of the LLM backend and the request
+    parameters that determine the answer (model, messages, temperature,
+    max_tokens, response_format), so fake-backend answers from load tests
+    are never served to real requests.
+    Lookups go to an in-process LRU with TTL first and then to the
+    ``llm_cache`` table, so re-running an analysis on an unchanged incident
+    costs neither latency nor tokens.
+    """
+
+    KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format")
+
+    _memory: Optional[LRUCache] = None
+    _counters = {
+        "memory_hits": 0,
+        "db_hits": 0,
+        "misses": 0,
+        "bypassed": 0,
+        "prompt_tokens_saved": 0,
+        "completion_tokens_saved": 0,
+    }
+
+    @staticmethod
+    def enabled() -> bool:
+        return os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+
+    @staticmethod
+    def ttl_seconds() -> float:
+        return float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+
+    @classmethod
+    def _get_memory(cls) -> LRUCache:
+        if cls._memory is None:
+            cls._memory = LRUCache(
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512)),
+                ttl_seconds=cls.ttl_seconds()
+            )
+        return cls._memory
+
+    @classmethod
+    def make_key(cls, params: Dict[str, Any]) -> str:
+        material = {field: params.get(field) for field in cls.KEY_FIELDS}
+        material["backend"] = LLMClient.backend_name()
+        return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def count_bypass(cls):
+        """A cacheable call that skipped the cache because the caller asked to refresh."""
+        cls._counters["bypassed"] += 1
+
+    @classmethod
+    def _hit(cls, outcome: str, entry: Dict[str, Any]):
+        cls._counters[outcome] += 1
+        cls._counters["prompt_tokens_saved"] += entry.get("prompt_tokens") or 0
+        cls._counters["completion_tokens_saved"] += entry.get("completion_tokens") or 0
+
+    @classmethod
+    async def get(cls, key: str) -> Optional[Dict[str, Any]]:
+        memory = cls._get_memory()
+        entry = memory.get(key)
+        if entry is not None:
+            cls._hit("memory_hits", entry)
+            return entry
+
+        try:
+            row = await Database.fetch_one(
+                '''SELECT content, prompt_tokens, completion_tokens FROM llm_cache
+                   WHERE cache_key = $1 AND expires_at > now()''',
+                key
+            )
+        except Exception as e:
+            print(f"LLM cache lookup failed: {e}")
+            row = None
+
+        if row is None:
+            cls._counters["misses"] += 1
+            return None
+
+        entry = dict(row)
+        cls._hit("db_hits", entry)
+        memory.set(key, entry)
+        return entry
+
+    @classmethod
+    async def set(cls, key: str, model: str, content: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        entry = {"content": content, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+        cls._get_memory().set(key, entry)
+
+        try:
+            await Database.execute(
+                '''INSERT INTO llm_cache (cache_key, model, content, prompt_tokens, completion_tokens, expires_at)
+                   VALUES ($1, $2, $3, $4, $5, now() + make_interval(secs => $6))
+                   ON CONFLICT (cache_key) DO UPDATE
+                   SET content = EXCLUDED.content, prompt_tokens = EXCLUDED.prompt_tokens,
+                       completion_tokens = EXCLUDED.completion_tokens, created_at = now(),
+                       expires_at = EXCLUDED.expires_at''',
+                key, model, content, prompt_tokens, completion_tokens, cls.ttl_seconds()
+            )
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+
+    @classmethod
+    def stats(cls) -> dict:
+        memory = cls._get_memory()
+        counters = cls._counters
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["db_hits"]
+        return {
+            "enabled": cls.enabled(),
+            "memory_entries": len(memory),
+            "memory_max_entries": memory.max_entries,
+            "memory_evictions": memory.evictions,
+            "ttl_seconds": memory.ttl_seconds,
+            **counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
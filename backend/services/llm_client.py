@@ -0,0 +1,436 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from services.llm_scheduler import LLMScheduler
+from services.prompt_budget import TokenCounter
+
+
+class LLMUnavailableError(Exception):
+    """The model API kept failing (429/5xx/network) after all retries."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+def estimate_tokens(params: Dict[str, Any]) -> int:
+    """Prompt + completion size used for rate limiting."""
+    tokens = 0
+    images = 0
+    for message in params.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += TokenCounter.count(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    tokens += TokenCounter.count(part.get("text", ""))
+                else:
+                    images += 1
+    return tokens + images * 1000 + (params.get("max_tokens") or 0)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenAIBackend:
+    """The OpenAI API on a pooled httpx.AsyncClient with keep-alive."""
+
+    def __init__(self):
+        timeout = float(os.getenv("LLM_TIMEOUT", 60))
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 64)),
+                max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", 32)),
+                keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30)),
+            ),
+            timeout=httpx.Timeout(timeout, connect=float(os.getenv("LLM_CONNECT_TIMEOUT", 10))),
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=0,
+        )
+
+    async def create(self, params: Dict[str, Any]) -> Any:
+        return await self.client.chat.completions.create(**params)
+
+    async def close(self):
+        await self.client.close()
+
+
+class FakeStream:
+    """Async iterator of ChatCompletionChunk objects, like an SDK stream."""
+
+    def __init__(self, chunks: List[ChatCompletionChunk], delay: float):
+        self._chunks = iter(chunks)
+        self._delay = delay
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ChatCompletionChunk:
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            raise StopAsyncIteration
+        if self._delay:
+            await asyncio.sleep(self._delay)
+        return chunk
+
+    async def close(self):
+        pass
+
+
+class FakeBackend:
+    """Local stand-in for the OpenAI API used for offline load tests.
+
+    Responses are derived from a hash of the prompt, so the same request
+    always gets the same answer, and match the shape each AIService prompt
+    asks for: JSON with the requested keys, the comprehensive RCA object,
+    or Markdown text. Latency is drawn from LLM_FAKE_LATENCY_DIST (``fixed``,
+    ``uniform`` or ``lognormal``) around LLM_FAKE_LATENCY_MS, and
+    LLM_FAKE_ERROR_RATE / LLM_FAKE_RATE_LIMIT_RATE inject 500s and 429s.
+    """
+
+    def __init__(self):
+        self.latency_ms = float(os.getenv("LLM_FAKE_LATENCY_MS", 800))
+        self.jitter_ms = float(os.getenv("LLM_FAKE_LATENCY_JITTER_MS", self.latency_ms / 2))
+        self.distribution = os.getenv("LLM_FAKE_LATENCY_DIST", "lognormal").lower()
+        self.error_rate = float(os.getenv("LLM_FAKE_ERROR_RATE", 0))
+        self.rate_limit_rate = float(os.getenv("LLM_FAKE_RATE_LIMIT_RATE", 0))
+        seed = os.getenv("LLM_FAKE_SEED")
+        self.random = random.Random(int(seed) if seed else None)
+
+    def _latency(self) -> float:
+        if self.distribution == "fixed":
+            latency = self.latency_ms
+        elif self.distribution == "uniform":
+            latency = self.random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        else:
+            sigma = self.jitter_ms / self.latency_ms if self.latency_ms else 0
+            latency = self.random.lognormvariate(math.log(max(self.latency_ms, 1)), sigma)
+        return max(0.0, latency) / 1000
+
+    def _maybe_fail(self):
+        request = httpx.Request("POST", "http://fake-llm/v1/chat/completions")
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            response = httpx.Response(429, headers={"retry-after": "1"}, request=request)
+            raise openai.RateLimitError("Fake rate limit", response=response, body=None)
+        if roll < self.rate_limit_rate + self.error_rate:
+            response = httpx.Response(500, request=request)
+            raise openai.InternalServerError("Fake server error", response=response, body=None)
+
+    @staticmethod
+    def _prompt(params: Dict[str, Any]) -> Tuple[str, bool]:
+        texts, has_image = [], False
+        for message in params.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, str):
+                texts.append(content)
+            elif isinstance(content, list):
+                for part in content:
+                    if part.get("type") == "text":
+                        texts.append(part.get("text", ""))
+                    else:
+                        has_image = True
+        return "\n".join(texts), has_image
+
+    @staticmethod
+    def _content(prompt: str, has_image: bool, rng: random.Random) -> str:
+        def items(topic: str, count: int = 3) -> List[str]:
+            return [f"{topic} {rng.randint(100, 999)}" for _ in range(count)]
+
+        if has_image:
+            return " ".join(items("Observed hazard near equipment tag", 2)) + ". Workers wear hard hats and hi-vis vests."
+
+        if "refinedAnalysis" in prompt:
+            return json.dumps({
+                "refinedAnalysis": {
+                    "executiveSummary": " ".join(items("Summary point")),
+                    "incidentSequence": items("Sequence step", 4),
+                    "evidenceReview": " ".join(items("Evidence item")),
+                },
+                "rootCauseAnalysis": {
+                    "fiveWhysAnalysis": [f"Why {n}: {text}" for n, text in enumerate(items("because of factor", 5), 1)],
+                    "fishboneDiagram": {
+                        category: items(f"{category} cause", 2)
+                        for category in ("People", "Process", "Equipment", "Environment", "Management")
+                    },
+                },
+                "contributingFactors": items("Contributing factor", 5),
+                "immediateCauses": items("Immediate cause", 3),
+                "rootCauses": items("Root cause", 2),
+                "correctiveActions": [
+                    {"action": action, "responsibility": "HSE Manager", "timeline": "30 days", "priority": "High"}
+                    for action in items("Corrective action", 5)
+                ],
+                "preventiveActions": items("Preventive action", 5),
+            })
+
+        keys = re.search(r"Format as JSON with keys: ([\w, ]+)", prompt)
+        if keys:
+            names = [name.strip() for name in keys.group(1).split(",") if name.strip()]
+            return json.dumps({
+                name: "Medium" if name == "risk_level" else items(name.replace("_", " ").capitalize())
+                for name in names
+            })
+
+        section = re.search(r'Write only the "([^"]+)" section', prompt)
+        if section:
+            return "\n".join(f"- {text}" for text in items(f"{section.group(1)} finding", 4))
+
+        return "\n\n".join(f"## {title}\n\n{text}" for title, text in zip(
+            ("Executive Summary", "Root Causes", "Corrective Actions", "Lessons Learned"),
+            items("Report content"),
+        ))
+
+    async def create(self, params: Dict[str, Any]) -> Any:
+        prompt, has_image = self._prompt(params)
+        latency = self._latency()
+        self._maybe_fail()
+
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        content = self._content(prompt, has_image, rng)
+        model = params.get("model", "fake")
+        usage = {
+            "prompt_tokens": TokenCounter.count(prompt),
+            "completion_tokens": TokenCounter.count(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if params.get("stream"):
+            words = re.findall(r"\S+\s*", content) or [""]
+            chunks = [
+                ChatCompletionChunk.model_validate({
+                    "id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+                })
+                for word in words
+            ]
+            chunks.append(ChatCompletionChunk.model_validate({
+                "id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [], "usage": usage,
+            }))
+            return FakeStream(chunks, latency / len(chunks))
+
+        await asyncio.sleep(latency)
+        return ChatCompletion.model_validate({
+            "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": usage,
+        })
+
+    async def close(self):
+        pass
+
+
+class LLMClient:
+    """One LLM backend shared by every request in the worker.
+
+    LLM_BACKEND selects the OpenAI API (default) or the local FakeBackend.
+    Every call gets a timeout. Admission goes through
+    LLMScheduler (concurrency, request/token rate and priority lanes);
+    429s, 5xx and network errors are retried here with jittered
+    exponential backoff that honours Retry-After, so the SDK's own retries
+    are disabled.
+    """
+
+    _client = None
+    _stats = {
+        "calls": 0,
+        "errors": 0,
+        "timeouts": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+    }
+
+    @staticmethod
+    def backend_name() -> str:
+        return os.getenv("LLM_BACKEND", "openai").lower()
+
+    @classmethod
+    def available(cls) -> bool:
+        return cls.backend_name() == "fake" or bool(os.getenv("OPENAI_API_KEY"))
+
+    @classmethod
+    def get_client(cls):
+        if cls._client is None:
+            cls._client = FakeBackend() if cls.backend_name() == "fake" else OpenAIBackend()
+        return cls._client
+
+    @classmethod
+    def start(cls):
+        if cls.available():
+            cls.get_client()
+
+    @classmethod
+    async def close(cls):
+        if cls._client is not None:
+            await cls._client.close()
+            cls._client = None
+
+    @classmethod
+    def _backoff(cls, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after
+        base = float(os.getenv("LLM_BACKOFF_BASE", 1))
+        cap = float(os.getenv("LLM_BACKOFF_MAX", 30))
+        # Full jitter keeps retries from many callers from arriving in lockstep.
+        return random.uniform(0, min(cap, base * 2 ** attempt))
+
+    @classmethod
+    async def _call(cls, client, params: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return await client.create(params)
+        except openai.APITimeoutError:
+            cls._stats["timeouts"] += 1
+            cls._stats["errors"] += 1
+            raise
+        except Exception:
+            cls._stats["errors"] += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            cls._stats["calls"] += 1
+            cls._stats["total_ms"] += elapsed
+            cls._stats["max_ms"] = max(cls._stats["max_ms"], elapsed)
+
+    @classmethod
+    async def chat(cls, timeout: Optional[float] = None, priority: int = LLMScheduler.INTERACTIVE, **kwargs) -> Any:
+        """``chat.completions.create`` through the shared client and scheduler."""
+        client = cls.get_client()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        estimated_tokens = estimate_tokens(kwargs)
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", 4))
+
+        for attempt in range(max_retries + 1):
+            await LLMScheduler.acquire(priority, estimated_tokens)
+            try:
+                response = await cls._call(client, kwargs)
+            except RETRYABLE_ERRORS as e:
+                rate_limited = isinstance(e, openai.RateLimitError)
+                delay = cls._backoff(attempt, e)
+                LLMScheduler.release(rate_limited=rate_limited, retry_after=retry_after_seconds(e))
+
+                if attempt >= max_retries:
+                    raise LLMUnavailableError(f"LLM request failed after {attempt + 1} attempts: {e}", delay) from e
+                print(f"LLM request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+                LLMScheduler.count_retry()
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                LLMScheduler.release()
+                raise
+
+            LLMScheduler.release()
+            if response.usage is not None:
+                cls._stats["prompt_tokens"] += response.usage.prompt_tokens
+                cls._stats["completion_tokens"] += response.usage.completion_tokens
+            return response
+
+    @classmethod
+    async def stream(
+        cls,
+        timeout: Optional[float] = None,
+        priority: int = LLMScheduler.INTERACTIVE,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Streaming ``chat.completions.create``; yields content deltas.
+
+        Only opening the stream is retried - once text has been yielded a
+        failure is raised to the caller. The scheduler slot is held until
+        the stream ends or the consumer stops iterating.
+        """
+        client = cls.get_client()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        kwargs.update(stream=True, stream_options={"include_usage": True})
+        estimated_tokens = estimate_tokens(kwargs)
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", 4))
+
+        for attempt in range(max_retries + 1):
+            await LLMScheduler.acquire(priority, estimated_tokens)
+            try:
+                stream = await cls._call(client, kwargs)
+            except RETRYABLE_ERRORS as e:
+                rate_limited = isinstance(e, openai.RateLimitError)
+                delay = cls._backoff(attempt, e)
+                LLMScheduler.release(rate_limited=rate_limited, retry_after=retry_after_seconds(e))
+
+                if attempt >= max_retries:
+                    raise LLMUnavailableError(f"LLM request failed after {attempt + 1} attempts: {e}", delay) from e
+                print(f"LLM stream failed to open ({e.__class__.__name__}), retrying in {delay:.1f}s")
+                LLMScheduler.count_retry()
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                LLMScheduler.release()
+                raise
+            break
+
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    cls._stats["prompt_tokens"] += chunk.usage.prompt_tokens
+                    cls._stats["completion_tokens"] += chunk.usage.completion_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            LLMScheduler.release()
+            await stream.close()
+
+    @classmethod
+    def stats(cls) -> dict:
+        calls = cls._stats["calls"]
+        return {
+            "backend": cls.backend_name(),
+            "started": cls._client is not None,
+            **{k: round(v, 2) if isinstance(v, float) else v for k, v in cls._stats.items() if k != "total_ms"},
+            "avg_ms": round(cls._stats["total_ms"] / calls, 2) if calls else 0.0,
+            "scheduler": LLMScheduler.stats(),
+        }
@@ -0,0 +1,169 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Dict, List, Optional
+
+
+class TokenBucket:
+    """Refills continuously at ``rate`` units per second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until ``amount`` can be consumed (0 when it can be now)."""
+        self._refill()
+        # A request larger than the bucket waits for a full bucket instead of forever.
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """Admission control for chat completions.
+
+    Callers wait in priority lanes (INTERACTIVE before BATCH, FIFO within a
+    lane) until a concurrency slot is free and both token buckets - requests
+    per minute and estimated tokens per minute - can cover the call. A 429
+    pauses dispatch for the server's Retry-After and halves the request
+    rate, which then recovers step by step as calls succeed.
+    """
+
+    INTERACTIVE = 0
+    BATCH = 1
+    LANES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+    _queue: List[tuple] = []
+    _sequence = itertools.count()
+    _in_flight: int = 0
+    _max_concurrency: int = 0
+    _requests: Optional[TokenBucket] = None
+    _tokens: Optional[TokenBucket] = None
+    _base_rate: float = 0
+    _paused_until: float = 0
+    _timer: Optional[asyncio.TimerHandle] = None
+    _lane_stats: Dict[int, Dict[str, float]] = {}
+    _stats = {"rate_limited": 0, "retries": 0}
+
+    @classmethod
+    def _setup(cls):
+        if cls._requests is None:
+            requests_per_minute = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 500))
+            tokens_per_minute = float(os.getenv("LLM_TOKENS_PER_MINUTE", 200000))
+            cls._max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+            cls._base_rate = requests_per_minute / 60
+            # Allow a burst of up to one tenth of the per-minute budget.
+            cls._requests = TokenBucket(cls._base_rate, max(1.0, requests_per_minute / 10))
+            cls._tokens = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 10))
+
+    @classmethod
+    def _lane(cls, priority: int) -> Dict[str, float]:
+        return cls._lane_stats.setdefault(
+            priority, {"queued": 0, "dispatched": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0}
+        )
+
+    @classmethod
+    def _dispatch(cls):
+        cls._timer = None
+        while cls._queue and cls._in_flight < cls._max_concurrency:
+            priority, _, estimated_tokens, future = cls._queue[0]
+            if future.done():
+                heapq.heappop(cls._queue)
+                continue
+
+            delay = max(
+                cls._paused_until - time.monotonic(),
+                cls._requests.time_until(1),
+                cls._tokens.time_until(estimated_tokens),
+            )
+            if delay > 0:
+                # Strict priority: lower lanes never overtake a waiting head.
+                cls._timer = asyncio.get_running_loop().call_later(delay, cls._dispatch)
+                return
+
+            heapq.heappop(cls._queue)
+            cls._requests.consume(1)
+            cls._tokens.consume(estimated_tokens)
+            cls._in_flight += 1
+            future.set_result(None)
+
+    @classmethod
+    async def acquire(cls, priority: int = INTERACTIVE, estimated_tokens: int = 0):
+        cls._setup()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(cls._queue, (priority, next(cls._sequence), estimated_tokens, future))
+        lane = cls._lane(priority)
+        lane["queued"] += 1
+        started = time.perf_counter()
+
+        if cls._timer is None:
+            cls._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                cls.release()
+            raise
+        finally:
+            lane["queued"] -= 1
+
+        waited = (time.perf_counter() - started) * 1000
+        lane["dispatched"] += 1
+        lane["wait_total_ms"] += waited
+        lane["wait_max_ms"] = max(lane["wait_max_ms"], waited)
+
+    @classmethod
+    def release(cls, rate_limited: bool = False, retry_after: Optional[float] = None):
+        cls._in_flight = max(0, cls._in_flight - 1)
+
+        if rate_limited:
+            cls._stats["rate_limited"] += 1
+            cls._requests.rate = max(cls._base_rate * 0.1, cls._requests.rate * 0.5)
+            if retry_after:
+                cls._paused_until = max(cls._paused_until, time.monotonic() + retry_after)
+        elif cls._requests is not None and cls._requests.rate < cls._base_rate:
+            cls._requests.rate = min(cls._base_rate, cls._requests.rate + cls._base_rate * 0.05)
+
+        if cls._timer is not None:
+            cls._timer.cancel()
+        cls._dispatch()
+
+    @classmethod
+    def count_retry(cls):
+        cls._stats["retries"] += 1
+
+    @classmethod
+    def stats(cls) -> dict:
+        cls._setup()
+        lanes = {}
+        for priority, name in cls.LANES.items():
+            lane = cls._lane(priority)
+            lanes[name] = {
+                "queued": lane["queued"],
+                "dispatched": lane["dispatched"],
+                "wait_avg_ms": round(lane["wait_total_ms"] / lane["dispatched"], 2) if lane["dispatched"] else 0.0,
+                "wait_max_ms": round(lane["wait_max_ms"], 2),
+            }
+        return {
+            "in_flight": cls._in_flight,
+            "max_concurrency": cls._max_concurrency,
+            "requests_per_minute": round(cls._requests.rate * 60, 2),
+            "paused_for_seconds": round(max(0.0, cls._paused_until - time.monotonic()), 2),
+            **cls._stats,
+            "lanes": lanes,
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from services.document_processor import DocumentProcessor, Source
+from services.processing_pool import ProcessingPool
+
+
+class PdfExtractionEngine:
+    """Page-parallel PDF text extraction on top of ProcessingPool.
+
+    The document is split into page ranges that are extracted concurrently,
+    at most one range per pool worker at a time. Ranges are consumed in page
+    order so extraction can stop as soon as the page or character budget is
+    met without parsing the rest of the file.
+    """
+
+    @staticmethod
+    def _budget(value: Optional[int], env_name: str) -> Optional[int]:
+        if value is not None:
+            return value
+        env_value = os.getenv(env_name)
+        return int(env_value) if env_value else None
+
+    @staticmethod
+    def _spool(pdf_data: bytes) -> str:
+        with tempfile.NamedTemporaryFile(prefix="rca-", suffix=".pdf", delete=False) as temp_file:
+            temp_file.write(pdf_data)
+        return temp_file.name
+
+    @staticmethod
+    async def extract(
+        pdf_data: Source,
+        max_pages: Optional[int] = None,
+        max_chars: Optional[int] = None,
+        pages_per_job: Optional[int] = None
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        max_pages = PdfExtractionEngine._budget(max_pages, "PDF_MAX_PAGES")
+        max_chars = PdfExtractionEngine._budget(max_chars, "PDF_MAX_CHARS")
+        pages_per_job = pages_per_job or int(os.getenv("PDF_PAGES_PER_JOB", 8))
+
+        page_count = await ProcessingPool.run(DocumentProcessor.count_pdf_pages, pdf_data)
+        page_limit = min(page_count, max_pages) if max_pages else page_count
+        # An unreadable page tree still gets one attempt over the whole file.
+        ranges = [
+            (first, min(first + pages_per_job, page_limit))
+            for first in range(0, page_limit, pages_per_job)
+        ] or [(0, max_pages)]
+
+        # Every range job pickles its arguments to a worker process, so a PDF
+        # held in memory is written out once and the jobs receive its path.
+        spooled_path = None
+        if isinstance(pdf_data, bytes) and len(ranges) > 1:
+            spooled_path = await asyncio.to_thread(PdfExtractionEngine._spool, pdf_data)
+            pdf_data = spooled_path
+
+        concurrency = max(1, ProcessingPool.stats()["workers"])
+        pending: List[asyncio.Task] = []
+        pages: List[Dict[str, Any]] = []
+        total_chars = 0
+        stopped_reason = None
+        next_range = 0
+
+        try:
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < concurrency:
+                    first, last = ranges[next_range]
+                    pending.append(asyncio.create_task(ProcessingPool.run(
+                        DocumentProcessor.extract_pdf_page_range, pdf_data, first, last, max_chars
+                    )))
+                    next_range += 1
+
+                for page in await pending.pop(0):
+                    pages.append(page)
+                    total_chars += len(page["text"])
+                    if max_chars is not None and total_chars >= max_chars:
+                        stopped_reason = "char_budget"
+                        break
+
+                if stopped_reason:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            # A range job still running after an early stop has the file open
+            # already, and unlinking an open file is safe.
+            if spooled_path is not None:
+                os.unlink(spooled_path)
+
+        if stopped_reason is None and max_pages and page_count > max_pages:
+            stopped_reason = "page_budget"
+
+        status_counts: Dict[str, int] = {}
+        for page in pages:
+            status_counts[page["status"]] = status_counts.get(page["status"], 0) + 1
+
+        return {
+            "text": DocumentProcessor.join_pdf_pages(pages),
+            "pages": pages,
+            "page_count": page_count,
+            "pages_processed": len(pages),
+            "status_counts": status_counts,
+            "stopped_reason": stopped_reason,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    @staticmethod
+    def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Extraction stats without the page text, for documents.metadata."""
+        return {
+            "page_count": result["page_count"],
+            "pages_processed": result["pages_processed"],
+            "status_counts": result["status_counts"],
+            "stopped_reason": result["stopped_reason"],
+            "elapsed_ms": result["elapsed_ms"],
+            "pages": [
+                {
+                    "page": page["page"],
+                    "status": page["status"],
+                    "method": page["method"],
+                    "chars": len(page["text"]),
+                    "elapsed_ms": page["elapsed_ms"],
+                }
+                for page in result["pages"]
+            ],
+        }
@@ -0,0 +1,152 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+class PoolSaturatedError(Exception):
+    pass
+
+
+class JobTimeoutError(Exception):
+    pass
+
+
+class ProcessingPool:
+    """Bounded process pool for CPU-bound document work (OCR, PDF parsing).
+
+    Jobs are admitted only while fewer than ``workers + max_queue`` are in
+    flight; beyond that ``run`` raises PoolSaturatedError so callers can shed
+    load instead of stalling the event loop.
+
+    A job that times out while still queued is cancelled. One that is already
+    running cannot be stopped without killing the jobs of every other caller,
+    so it keeps its worker (and its capacity slot) until it finishes; such
+    jobs are reported as ``abandoned_running`` in ``stats()``.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _workers: int = 0
+    _max_queue: int = 0
+    _job_timeout: float = 0
+    _in_flight: int = 0
+    _abandoned: set = set()
+    _generation: int = 0
+    _lock = threading.Lock()
+    _stats = {
+        "submitted": 0,
+        "completed": 0,
+        "failed": 0,
+        "rejected": 0,
+        "timed_out": 0,
+        "total_run_ms": 0.0,
+    }
+
+    @classmethod
+    def start(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            cls._workers = int(os.getenv("DOC_POOL_WORKERS", os.cpu_count() or 2))
+            cls._max_queue = int(os.getenv("DOC_POOL_MAX_QUEUE", cls._workers * 4))
+            cls._job_timeout = float(os.getenv("DOC_POOL_JOB_TIMEOUT", 120))
+            start_method = os.getenv("DOC_POOL_START_METHOD", "spawn")
+
+            cls._executor = ProcessPoolExecutor(
+                max_workers=cls._workers,
+                mp_context=multiprocessing.get_context(start_method)
+            )
+        return cls._executor
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+            with cls._lock:
+                # Callbacks of the old executor's jobs check the generation
+                # and leave the new pool's counters alone.
+                cls._generation += 1
+                cls._in_flight = 0
+                cls._abandoned = set()
+
+    @classmethod
+    def capacity(cls) -> int:
+        cls.start()
+        return cls._workers + cls._max_queue
+
+    @classmethod
+    def is_saturated(cls) -> bool:
+        return cls._in_flight >= cls.capacity()
+
+    @classmethod
+    def _on_done(cls, started: float, generation: int, future):
+        # Runs on the executor's management thread.
+        with cls._lock:
+            if generation == cls._generation:
+                cls._in_flight -= 1
+                cls._abandoned.discard(future)
+            cls._stats["total_run_ms"] += (time.perf_counter() - started) * 1000
+            if future.cancelled() or future.exception() is not None:
+                cls._stats["failed"] += 1
+            else:
+                cls._stats["completed"] += 1
+
+    @classmethod
+    async def run(cls, func: Callable, *args, timeout: Optional[float] = None) -> Any:
+        executor = cls.start()
+
+        if cls.is_saturated():
+            cls._stats["rejected"] += 1
+            raise PoolSaturatedError(
+                f"Document processing pool is saturated ({cls._in_flight} jobs in flight)"
+            )
+
+        started = time.perf_counter()
+        future = executor.submit(func, *args)
+        with cls._lock:
+            cls._in_flight += 1
+            cls._stats["submitted"] += 1
+            generation = cls._generation
+        # The slot is released when the worker actually finishes, not when the
+        # caller gives up waiting, so timed-out jobs still count against capacity.
+        future.add_done_callback(partial(cls._on_done, started, generation))
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                timeout=timeout if timeout is not None else cls._job_timeout
+            )
+        except asyncio.TimeoutError:
+            cls._stats["timed_out"] += 1
+            # Frees the slot at once if the job never started; otherwise the
+            # worker stays busy with it until it finishes.
+            if not future.cancel():
+                with cls._lock:
+                    if generation == cls._generation and not future.done():
+                        cls._abandoned.add(future)
+            raise JobTimeoutError(f"Document processing job exceeded {timeout or cls._job_timeout}s")
+        except BrokenProcessPool:
+            # A worker died (segfault in a native OCR library, OOM kill); drop
+            # the executor so the next job gets a fresh pool.
+            if cls._executor is executor:
+                cls.shutdown()
+            raise
+
+    @classmethod
+    def stats(cls) -> dict:
+        cls.start()
+        finished = cls._stats["completed"] + cls._stats["failed"]
+        return {
+            "workers": cls._workers,
+            "max_queue": cls._max_queue,
+            "job_timeout_seconds": cls._job_timeout,
+            "in_flight": cls._in_flight,
+            "abandoned_running": len(cls._abandoned),
+            "saturated": cls.is_saturated(),
+            **{k: v for k, v in cls._stats.items() if k != "total_run_ms"},
+            "avg_run_ms": round(cls._stats["total_run_ms"] / finished, 2) if finished else 0.0,
+        }
@@ -0,0 +1,140 @@
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TRUNCATION_MARKER = "... [truncated]"
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when available, else about 4 chars per token."""
+
+    _encoding = None
+    _loaded = False
+
+    @classmethod
+    def _get_encoding(cls):
+        if not cls._loaded:
+            cls._loaded = True
+            if tiktoken is not None:
+                try:
+                    cls._encoding = tiktoken.get_encoding(os.getenv("LLM_TOKENIZER", "o200k_base"))
+                except Exception as e:
+                    # The BPE files are downloaded on first use; offline hosts fall back.
+                    print(f"tiktoken unavailable, estimating tokens from characters: {e}")
+        return cls._encoding
+
+    @classmethod
+    async def load(cls):
+        """Load the encoding off the event loop; called once at startup.
+
+        Loading may download the BPE file, so it must not first happen
+        inside a request.
+        """
+        await asyncio.to_thread(cls._get_encoding)
+
+    @classmethod
+    def count(cls, text: str) -> int:
+        if not text:
+            return 0
+        encoding = cls._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    @classmethod
+    def truncate(cls, text: str, max_tokens: int) -> str:
+        if cls.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+
+        keep = max_tokens - cls.count(TRUNCATION_MARKER)
+        if keep <= 0:
+            return ""
+        encoding = cls._get_encoding()
+        if encoding is not None:
+            head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+        else:
+            head = text[:keep * 4]
+        return head.rstrip() + TRUNCATION_MARKER
+
+
+class PromptBudget:
+    """Share a prompt's token budget between its variable fields.
+
+    Fields are filled greedily in priority order (lower number first), each
+    up to its own cap, until the budget runs out. List fields such as
+    witness statements or document excerpts split their allotment evenly so
+    one long document cannot crowd out the rest.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self._fields: List[dict] = []
+        self.usage: Dict[str, int] = {}
+
+    def add(self, name: str, text: Optional[str], priority: int, max_tokens: Optional[int] = None):
+        self._fields.append({"name": name, "items": [text or ""], "priority": priority, "cap": max_tokens})
+
+    def add_items(
+        self,
+        name: str,
+        items: List[str],
+        priority: int,
+        max_tokens: Optional[int] = None,
+        separator: str = "\n\n"
+    ):
+        self._fields.append({
+            "name": name, "items": [item for item in items if item], "priority": priority,
+            "cap": max_tokens, "separator": separator,
+        })
+
+    @staticmethod
+    def _fair_shares(sizes: List[int], allotment: int) -> List[int]:
+        shares = [0] * len(sizes)
+        remaining = allotment
+        open_items = [index for index, size in enumerate(sizes) if size > 0]
+        while open_items and remaining > 0:
+            share = max(1, remaining // len(open_items))
+            still_open = []
+            for index in open_items:
+                grant = min(share, sizes[index] - shares[index], remaining)
+                shares[index] += grant
+                remaining -= grant
+                if shares[index] < sizes[index]:
+                    still_open.append(index)
+            open_items = still_open
+        return shares
+
+    def allocate(self) -> Dict[str, str]:
+        remaining = self.max_tokens
+        result: Dict[str, str] = {}
+
+        for field in sorted(self._fields, key=lambda f: f["priority"]):
+            sizes = [TokenCounter.count(item) for item in field["items"]]
+            separator_tokens = TokenCounter.count(field["separator"]) * (len(sizes) - 1) if len(sizes) > 1 else 0
+            wanted = sum(sizes) + separator_tokens
+            allotment = max(0, min(wanted, remaining, field["cap"] if field["cap"] is not None else wanted) - separator_tokens)
+            shares = self._fair_shares(sizes, allotment) if len(sizes) > 1 else [allotment]
+
+            parts = [
+                TokenCounter.truncate(item, share)
+                for item, share, size in zip(field["items"], shares, sizes)
+                if share > 0 or size == 0
+            ]
+            text = field.get("separator", "").join(part for part in parts if part)
+            used = TokenCounter.count(text)
+            result[field["name"]] = text
+            self.usage[field["name"]] = used
+            remaining = max(0, remaining - used)
+
+        return result
+
+    @property
+    def used_tokens(self) -> int:
+        return sum(self.usage.values())
@@ -0,0 +1,75 @@
+import json
+from typing import Any, Dict, Optional
+
+from utils.database import Database
+
+
+class ResultWriter:
+    """Persist an analysis or report result in one atomic statement.
+
+    The insert, the optional status change on ``incidents`` and the
+    ``audit_logs`` entry are data-modifying CTEs of a single statement, so
+    they commit together in one round trip. The audit details get the new
+    row's id under ``id_key``.
+    """
+
+    _queries: Dict[tuple, str] = {}
+
+    @classmethod
+    def _query(cls, table: str, columns: tuple, incident_columns: tuple) -> str:
+        key = (table, columns, incident_columns)
+        if key not in cls._queries:
+            placeholders = ", ".join(f"${index}" for index in range(1, len(columns) + 1))
+            next_param = len(columns) + 1
+            # $n..: incident_id, action_type, action_details, entity_type, id_key, performed_by, status values
+            incident_id, action, details, entity_type, id_key, performed_by = (
+                f"${next_param + offset}" for offset in range(6)
+            )
+            status_update = ""
+            if incident_columns:
+                assignments = ", ".join(
+                    f"{column} = ${next_param + 6 + offset}" for offset, column in enumerate(incident_columns)
+                )
+                status_update = f"""
+status_update AS (
+    UPDATE incidents SET {assignments} WHERE id = {incident_id}
+),"""
+            cls._queries[key] = f"""WITH inserted AS (
+    INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders}) RETURNING id
+),{status_update}
+audit AS (
+    INSERT INTO audit_logs (incident_id, action_type, action_details, entity_type, entity_id, performed_by)
+    SELECT {incident_id}, {action}, {details}::jsonb || jsonb_build_object({id_key}::text, inserted.id::text),
+           {entity_type}, inserted.id, {performed_by}
+    FROM inserted
+)
+SELECT id FROM inserted"""
+        return cls._queries[key]
+
+    @classmethod
+    async def save(
+        cls,
+        table: str,
+        values: Dict[str, Any],
+        incident_id,
+        action_type: str,
+        entity_type: str,
+        id_key: str,
+        action_details: Optional[Dict[str, Any]] = None,
+        incident_updates: Optional[Dict[str, Any]] = None,
+        performed_by=None
+    ) -> Optional[str]:
+        """Insert ``values`` into ``table``, apply ``incident_updates`` and log the action.
+
+        Returns the new row's id as a string, or None if nothing was inserted.
+        """
+        incident_updates = incident_updates or {}
+        query = cls._query(table, tuple(values), tuple(incident_updates))
+        async with Database.acquire() as conn:
+            new_id = await conn.fetchval(
+                query,
+                *values.values(),
+                incident_id, action_type, json.dumps(action_details or {}), entity_type, id_key, performed_by,
+                *incident_updates.values()
+            )
+        return str(new_id) if new_id else None
@@ -0,0 +1,109 @@
+import os
+from typing import Any, Dict, Optional, Sequence
+
+from utils.database import Database
+
+SEARCH_KINDS = ("document", "incident")
+
+# Each kind takes at most $6 matching rows from the GIN index before any
+# ranking, so ts_rank and the detoasting it needs never see more than that.
+MATCH_QUERIES = {
+    "document": '''SELECT 'document' AS kind, c.id, c.incident_id, ts_rank(c.search_vector, q.query, 1) AS rank
+                   FROM (SELECT d.id, d.incident_id, d.search_vector
+                         FROM documents d, q
+                         WHERE d.search_vector @@ q.query AND ($4::uuid IS NULL OR d.incident_id = $4)
+                         LIMIT $6) c, q''',
+    "incident": '''SELECT 'incident' AS kind, c.id, c.id AS incident_id, ts_rank(c.search_vector, q.query, 1) AS rank
+                   FROM (SELECT i.id, i.search_vector
+                         FROM incidents i, q
+                         WHERE i.search_vector @@ q.query AND ($4::uuid IS NULL OR i.id = $4)
+                         LIMIT $6) c, q''',
+}
+
+
+class SearchService:
+    """Ranked full-text search over document text and incidents.
+
+    Matching uses the generated ``search_vector`` columns and their GIN
+    indexes. At most ``SEARCH_MAX_CANDIDATES`` matches per kind are ranked,
+    which bounds the ranking work for common terms; ``total`` counts those
+    candidates and ``total_capped`` says when there were more. Only the
+    rows of the requested page are joined back to their text for
+    ``ts_headline``, which reads at most ``SEARCH_HEADLINE_MAX_CHARS``.
+    """
+
+    _queries: Dict[tuple, str] = {}
+
+    @classmethod
+    def _query(cls, kinds: Sequence[str]) -> str:
+        key = tuple(kinds)
+        if key not in cls._queries:
+            matches = "\n    UNION ALL\n    ".join(MATCH_QUERIES[kind] for kind in key)
+            cls._queries[key] = f'''WITH q AS (SELECT websearch_to_tsquery('english', $1) AS query),
+matches AS (
+    {matches}
+),
+counted AS (
+    SELECT kind, id, incident_id, rank, count(*) OVER (PARTITION BY kind) AS kind_total
+    FROM matches
+),
+page AS (
+    SELECT kind, id, incident_id, rank, count(*) OVER () AS total, max(kind_total) OVER () AS max_kind_total
+    FROM counted
+    ORDER BY rank DESC, id
+    LIMIT $2 OFFSET $3
+)
+SELECT p.kind, p.id, p.incident_id, p.rank, p.total, p.max_kind_total,
+       COALESCE(d.filename, i.title) AS title,
+       parent.title AS incident_title,
+       ts_headline(
+           'english',
+           left(COALESCE(NULLIF(d.extracted_text, 'processing'), d.metadata->>'ai_description', i.description, ''), $5),
+           q.query,
+           'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter=" ... "'
+       ) AS snippet
+FROM page p
+CROSS JOIN q
+LEFT JOIN documents d ON p.kind = 'document' AND d.id = p.id
+LEFT JOIN incidents i ON p.kind = 'incident' AND i.id = p.id
+LEFT JOIN incidents parent ON parent.id = p.incident_id
+ORDER BY p.rank DESC, p.id'''
+        return cls._queries[key]
+
+    @classmethod
+    async def search(
+        cls,
+        query: str,
+        page: int = 1,
+        page_size: int = 20,
+        kinds: Sequence[str] = SEARCH_KINDS,
+        incident_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        kinds = [kind for kind in SEARCH_KINDS if kind in kinds]
+        max_candidates = int(os.getenv("SEARCH_MAX_CANDIDATES", 1000))
+        rows = await Database.fetch_all(
+            cls._query(kinds),
+            query, page_size, (page - 1) * page_size, incident_id,
+            int(os.getenv("SEARCH_HEADLINE_MAX_CHARS", 50000)), max_candidates
+        )
+
+        return {
+            "query": query,
+            "page": page,
+            "page_size": page_size,
+            # Past the last page there are no rows to carry the count.
+            "total": rows[0]["total"] if rows else (0 if page == 1 else None),
+            "total_capped": bool(rows) and rows[0]["max_kind_total"] >= max_candidates,
+            "results": [
+                {
+                    "kind": row["kind"],
+                    "id": str(row["id"]),
+                    "incident_id": str(row["incident_id"]),
+                    "title": row["title"],
+                    "incident_title": row["incident_title"],
+                    "rank": round(float(row["rank"]), 6),
+                    "snippet": row["snippet"],
+                }
+                for row in rows
+            ],
+        }
@@ -0,0 +1,278 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.database import Database
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from had has have in into is it its of on or that the their "
+    "there this to was were which while with".split()
+)
+
+
+def _root_cause_texts(value) -> List[str]:
+    """Root causes as plain strings; they are stored as JSON lists of strings or objects."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value] if value else []
+    texts = []
+    for item in value or []:
+        if isinstance(item, dict):
+            item = item.get("cause") or item.get("description") or item.get("title") or json.dumps(item)
+        if item:
+            texts.append(str(item))
+    return texts
+
+
+def embed_text(text: str, dim: int) -> np.ndarray:
+    """Hashed bag of words and bigrams with sublinear term frequency."""
+    words = [w for w in TOKEN_PATTERN.findall(text.lower()) if len(w) > 1 and w not in STOP_WORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    counts = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        counts[int.from_bytes(digest, "little") % dim] += 1
+    return np.log1p(counts, out=counts)
+
+
+class SimilarIncidentIndex:
+    """In-memory TF-IDF index over past incidents for "similar incident" lookups.
+
+    Each incident's title (weighted twice), location, description and
+    finalized root causes are hashed into a fixed-size term-frequency vector
+    stored in ``incident_vectors``. Workers load the table once, then pull
+    only rows updated since their last sync, so an incident indexed by one
+    worker is visible to the others within ``SIMILAR_INDEX_SYNC_INTERVAL``
+    seconds. IDF weights are derived from the document frequencies of the
+    loaded vectors and queries are a cosine top-k over a NumPy matrix.
+    """
+
+    _ids: List[str] = []
+    _positions: Dict[str, int] = {}
+    _titles: List[str] = []
+    _root_causes: List[List[str]] = []
+    _matrix: Optional[np.ndarray] = None
+    _df: Optional[np.ndarray] = None
+    _norms: Optional[np.ndarray] = None
+    _synced_until: Optional[datetime] = None
+    _last_sync = 0.0
+    _lock: Optional[asyncio.Lock] = None
+    _counters = {"queries": 0, "indexed": 0, "synced_rows": 0}
+
+    @staticmethod
+    def dim() -> int:
+        return int(os.getenv("SIMILAR_INDEX_DIM", 2048))
+
+    @staticmethod
+    def incident_text(incident: Dict[str, Any], root_causes: List[str]) -> str:
+        title = incident.get('title') or ''
+        parts = [title, title, incident.get('location') or '', incident.get('description') or '']
+        return "\n".join(parts + root_causes)
+
+    @classmethod
+    def _apply(cls, incident_id: str, title: str, root_causes: List[str], vector: np.ndarray):
+        dim = cls.dim()
+        if cls._matrix is None or cls._matrix.shape[1] != dim:
+            cls._ids, cls._positions, cls._titles, cls._root_causes = [], {}, [], []
+            cls._matrix = np.zeros((256, dim), dtype=np.float32)
+            cls._df = np.zeros(dim, dtype=np.float32)
+
+        position = cls._positions.get(incident_id)
+        if position is None:
+            position = len(cls._ids)
+            if position == cls._matrix.shape[0]:
+                grown = np.zeros((position * 2, dim), dtype=np.float32)
+                grown[:position] = cls._matrix
+                cls._matrix = grown
+            cls._ids.append(incident_id)
+            cls._titles.append(title)
+            cls._root_causes.append(root_causes)
+            cls._positions[incident_id] = position
+        else:
+            cls._df -= cls._matrix[position] > 0
+            cls._titles[position] = title
+            cls._root_causes[position] = root_causes
+
+        cls._matrix[position] = vector
+        cls._df += vector > 0
+        cls._norms = None
+
+    @classmethod
+    async def sync(cls, force: bool = False):
+        """Pull vectors written since the last sync (by any worker)."""
+        interval = float(os.getenv("SIMILAR_INDEX_SYNC_INTERVAL", 5))
+        if not force and cls._matrix is not None and time.monotonic() - cls._last_sync < interval:
+            return
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+
+        async with cls._lock:
+            rows = await Database.fetch_all(
+                '''SELECT incident_id, title, root_causes, vector, updated_at FROM incident_vectors
+                   WHERE dim = $1 AND ($2::timestamptz IS NULL OR updated_at >= $2)
+                   ORDER BY updated_at''',
+                cls.dim(), cls._synced_until
+            )
+            for row in rows:
+                cls._apply(
+                    str(row["incident_id"]), row["title"] or "", _root_cause_texts(row["root_causes"]),
+                    np.frombuffer(row["vector"], dtype=np.float32)
+                )
+                cls._synced_until = row["updated_at"]
+            cls._counters["synced_rows"] += len(rows)
+            cls._last_sync = time.monotonic()
+
+    @classmethod
+    async def index_incident(cls, incident_id: str) -> bool:
+        """(Re)index one incident from its current row and latest finalized root causes."""
+        incident = await Database.fetch_one(
+            '''SELECT i.*,
+                      (SELECT s.root_causes FROM ai_analysis_second_pass s
+                       WHERE s.incident_id = i.id AND s.processing_status = 'completed'
+                       ORDER BY s.created_at DESC
+                       LIMIT 1) AS finalized_root_causes
+               FROM incidents i WHERE i.id = $1''',
+            incident_id
+        )
+        if not incident:
+            return False
+
+        incident = dict(incident)
+        root_causes = _root_cause_texts(incident.get('finalized_root_causes'))
+        vector = embed_text(cls.incident_text(incident, root_causes), cls.dim())
+
+        await Database.execute(
+            '''INSERT INTO incident_vectors (incident_id, title, root_causes, vector, dim, updated_at)
+               VALUES ($1, $2, $3, $4, $5, now())
+               ON CONFLICT (incident_id) DO UPDATE
+               SET title = EXCLUDED.title, root_causes = EXCLUDED.root_causes, vector = EXCLUDED.vector,
+                   dim = EXCLUDED.dim, updated_at = now()''',
+            incident_id, incident.get('title') or '', json.dumps(root_causes), vector.tobytes(), cls.dim()
+        )
+        cls._apply(str(incident_id), incident.get('title') or '', root_causes, vector)
+        cls._counters["indexed"] += 1
+        return True
+
+    @classmethod
+    async def refresh(cls, incident_id: str):
+        """index_incident for request handlers: failures are logged, not raised."""
+        try:
+            await cls.index_incident(incident_id)
+        except Exception as e:
+            print(f"Error indexing incident {incident_id}: {e}")
+
+    @classmethod
+    async def backfill(cls, limit: int = 1000, full: bool = False) -> int:
+        """Index up to ``limit`` incidents that have no vector yet, or every incident with ``full``."""
+        rows = await Database.fetch_all(
+            '''SELECT i.id FROM incidents i
+               WHERE $1 OR NOT EXISTS (
+                   SELECT 1 FROM incident_vectors v WHERE v.incident_id = i.id AND v.dim = $2)
+               ORDER BY i.created_at
+               LIMIT $3''',
+            full, cls.dim(), None if full else limit
+        )
+        indexed = 0
+        for row in rows:
+            try:
+                if await cls.index_incident(str(row["id"])):
+                    indexed += 1
+            except Exception as e:
+                print(f"Error indexing incident {row['id']}: {e}")
+        return indexed
+
+    @classmethod
+    def _search(cls, vector: np.ndarray, limit: int, exclude: Optional[str]) -> List[Dict[str, Any]]:
+        count = len(cls._ids)
+        if count == 0 or not vector.any():
+            return []
+
+        matrix = cls._matrix[:count]
+        idf = np.log((1 + count) / (1 + cls._df)) + 1
+        idf_squared = idf * idf
+        if cls._norms is None:
+            cls._norms = np.sqrt(np.einsum("ij,ij,j->i", matrix, matrix, idf_squared))
+        query_norm = math.sqrt(float(np.dot(vector * vector, idf_squared)))
+
+        scores = matrix @ (vector * idf_squared)
+        scores /= np.maximum(cls._norms * query_norm, 1e-12)
+        if exclude in cls._positions:
+            scores[cls._positions[exclude]] = -1.0
+
+        limit = min(limit, count)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "incident_id": cls._ids[position],
+                "title": cls._titles[position],
+                "score": round(float(scores[position]), 4),
+                "root_causes": cls._root_causes[position],
+            }
+            for position in top
+            if scores[position] > 0
+        ]
+
+    @classmethod
+    async def similar_to_incident(cls, incident_id: str, limit: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Top matches for an incident; None if the incident does not exist."""
+        await cls.sync()
+        cls._counters["queries"] += 1
+
+        position = cls._positions.get(str(incident_id))
+        if position is not None:
+            vector = cls._matrix[position].copy()
+        else:
+            incident = await Database.fetch_one('SELECT * FROM incidents WHERE id = $1', incident_id)
+            if not incident:
+                return None
+            vector = embed_text(cls.incident_text(dict(incident), []), cls.dim())
+        return cls._search(vector, limit, str(incident_id))
+
+    @classmethod
+    async def prompt_context(cls, incident: Dict[str, Any]) -> List[str]:
+        """Root causes of the closest past incidents, formatted for the first-pass prompt.
+
+        Empty when SIMILAR_INCIDENTS_IN_PROMPT is off or nothing scores
+        above SIMILAR_INCIDENTS_MIN_SCORE; never raises.
+        """
+        if os.getenv("SIMILAR_INCIDENTS_IN_PROMPT", "true").lower() != "true":
+            return []
+        try:
+            await cls.sync()
+            cls._counters["queries"] += 1
+            vector = embed_text(cls.incident_text(incident, []), cls.dim())
+            matches = cls._search(vector, int(os.getenv("SIMILAR_INCIDENTS_PROMPT_K", 3)), str(incident.get('id')))
+        except Exception as e:
+            print(f"Error finding similar incidents: {e}")
+            return []
+
+        min_score = float(os.getenv("SIMILAR_INCIDENTS_MIN_SCORE", 0.3))
+        return [
+            f"{match['title']} (similarity {match['score']:.2f}): {'; '.join(match['root_causes'])}"
+            for match in matches
+            if match["score"] >= min_score and match["root_causes"]
+        ]
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "incidents": len(cls._ids),
+            "dim": cls.dim(),
+            "matrix_bytes": int(cls._matrix[:len(cls._ids)].nbytes) if cls._matrix is not None else 0,
+            "synced_until": cls._synced_until.isoformat() if cls._synced_until else None,
+            **cls._counters,
+        }
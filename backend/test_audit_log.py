@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import audit_log
+from services.audit_log import AuditLog
+
+
+class StubConnection:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.copies = []
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.fail:
+            raise RuntimeError("COPY rejected")
+        self.copies.append(list(records))
+
+
+def stub_database(monkeypatch, conn: StubConnection):
+    inserts = []
+
+    @asynccontextmanager
+    async def acquire():
+        yield conn
+
+    async def execute(query, *args):
+        inserts.append(args)
+
+    monkeypatch.setattr(audit_log.Database, "acquire", acquire)
+    monkeypatch.setattr(audit_log.Database, "execute", execute)
+    return inserts
+
+
+def reset(monkeypatch, running: bool = True):
+    monkeypatch.setattr(AuditLog, "_buffer", audit_log.deque())
+    monkeypatch.setattr(AuditLog, "_flush_lock", None)
+    monkeypatch.setattr(AuditLog, "_stats", dict(AuditLog._stats, written=0, sync_writes=0, failed=0))
+    # A placeholder flusher: record() only checks that the writer is running.
+    monkeypatch.setattr(AuditLog, "_flusher", object() if running else None)
+    monkeypatch.setattr(AuditLog, "_wakeup", asyncio.Event())
+
+
+def record(n: int):
+    return AuditLog.record("inc-1", "DOCUMENT_PROCESSED", {"n": n}, "document", f"doc-{n}")
+
+
+def test_record_buffers_and_flush_copies(monkeypatch):
+    reset(monkeypatch)
+    conn = StubConnection()
+    inserts = stub_database(monkeypatch, conn)
+
+    async def scenario():
+        for n in range(3):
+            await record(n)
+        assert len(AuditLog._buffer) == 3
+        await AuditLog.flush()
+
+    asyncio.run(scenario())
+
+    assert [row[4] for row in conn.copies[0]] == ["doc-0", "doc-1", "doc-2"]
+    assert inserts == []
+    assert AuditLog._stats["written"] == 3
+
+
+def test_full_buffer_writes_synchronously(monkeypatch):
+    reset(monkeypatch)
+    monkeypatch.setenv("AUDIT_BUFFER_MAX", "2")
+    inserts = stub_database(monkeypatch, StubConnection())
+
+    async def scenario():
+        for n in range(3):
+            await record(n)
+
+    asyncio.run(scenario())
+
+    assert len(AuditLog._buffer) == 2
+    assert [args[4] for args in inserts] == ["doc-2"]
+    assert AuditLog._stats["sync_writes"] == 1
+
+
+def test_failed_copy_falls_back_to_row_inserts(monkeypatch):
+    reset(monkeypatch)
+    inserts = stub_database(monkeypatch, StubConnection(fail=True))
+
+    async def scenario():
+        for n in range(2):
+            await record(n)
+        await AuditLog.flush()
+
+    asyncio.run(scenario())
+
+    assert [args[4] for args in inserts] == ["doc-0", "doc-1"]
+    assert AuditLog._stats["written"] == 2
+    assert not AuditLog._buffer
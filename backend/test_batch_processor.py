@@ -0,0 +1,36 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import batch_processor
+from services.batch_processor import IncidentBatchProcessor
+
+
+def test_aborted_batch_releases_its_claimed_documents(monkeypatch):
+    executed = []
+
+    async def fetch_all(query, *args):
+        return [{"id": "doc-1"}, {"id": "doc-2"}]
+
+    async def execute(query, *args):
+        executed.append((query, args))
+
+    async def process_claimed(*args):
+        raise RuntimeError("pool crashed")
+
+    monkeypatch.setattr(batch_processor.Database, "fetch_all", fetch_all)
+    monkeypatch.setattr(batch_processor.Database, "execute", execute)
+    monkeypatch.setattr(IncidentBatchProcessor, "_process_claimed", process_claimed)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(IncidentBatchProcessor.process_incident("inc-1"))
+
+    query, (ids, metadata) = executed[0]
+    assert "metadata->>'status' = 'processing'" in query
+    assert ids == ["doc-1", "doc-2"]
+    assert json.loads(metadata)["status"] == "failed"
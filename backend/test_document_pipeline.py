@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import document_pipeline
+from services.document_pipeline import DocumentPipeline
+from services.extraction_cache import ExtractionCache
+from utils.storage import SpooledDownload
+
+IMAGE = b"fake image bytes"
+
+
+def fake_pipeline(monkeypatch, cached: dict):
+    """Stub storage, the pool and the cache; return the calls each stage made."""
+    calls = {"ocr": 0, "describe": 0, "cache_set": {}}
+
+    async def get_etag(path):
+        return "etag"
+
+    async def download_spooled(path, max_in_memory=None):
+        return SpooledDownload(data=IMAGE, size=len(IMAGE))
+
+    async def cache_get(content_hash, kind):
+        return cached.get(kind)
+
+    async def cache_set(content_hash, kind, value):
+        calls["cache_set"][kind] = value
+
+    async def pool_run(func, *args, timeout=None):
+        if func.__name__ == "normalize_image":
+            return None
+        calls["ocr"] += 1
+        return ""
+
+    async def describe(file_data, file_type, content_hash=None):
+        calls["describe"] += 1
+        return "A pump with a cracked housing."
+
+    monkeypatch.setattr(document_pipeline.AsyncStorageClient, "get_etag", get_etag)
+    monkeypatch.setattr(document_pipeline.AsyncStorageClient, "download_spooled", download_spooled)
+    monkeypatch.setattr(ExtractionCache, "get", cache_get)
+    monkeypatch.setattr(ExtractionCache, "set", cache_set)
+    monkeypatch.setattr(document_pipeline.ProcessingPool, "run", pool_run)
+    monkeypatch.setattr(document_pipeline, "get_ai_description", describe)
+    return calls
+
+
+def run_image():
+    doc = {"id": "doc-1", "incident_id": "inc-1", "storage_path": "a/b.png", "metadata": {}}
+    return asyncio.run(DocumentPipeline.run(doc, "image/png"))
+
+
+def test_cached_description_only_reruns_ocr(monkeypatch):
+    calls = fake_pipeline(monkeypatch, {ExtractionCache.AI_DESCRIPTION: "Cached description"})
+
+    result = run_image()
+
+    assert calls["ocr"] == 1
+    assert calls["describe"] == 0
+    assert result["ai_description"] == "Cached description"
+    assert result["metadata"]["status"] == "completed"
+
+
+def test_empty_ocr_text_is_cached(monkeypatch):
+    calls = fake_pipeline(monkeypatch, {})
+
+    result = run_image()
+
+    assert calls["describe"] == 1
+    assert result["ocr_text"] == ""
+    assert calls["cache_set"][ExtractionCache.OCR_TEXT] == ""
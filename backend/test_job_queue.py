@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import job_queue
+from services.job_queue import DocumentJobQueue, JobConflictError
+
+
+def stub_fetch_one(monkeypatch, respond):
+    """Route Database.fetch_one through ``respond(query, args)`` and record the calls."""
+    calls = []
+
+    async def fetch_one(query, *args):
+        calls.append((query, args))
+        return respond(query, args)
+
+    monkeypatch.setattr(job_queue.Database, "fetch_one", fetch_one)
+    monkeypatch.setattr(DocumentJobQueue, "_wakeup", None)
+    return calls
+
+
+def test_update_locked_appends_id_and_lock_conditions(monkeypatch):
+    calls = stub_fetch_one(monkeypatch, lambda query, args: {"id": args[-2]})
+
+    updated = asyncio.run(DocumentJobQueue._update_locked(
+        'UPDATE document_jobs SET progress = $1', '{"stage": "ocr"}', "job-1"
+    ))
+
+    query, args = calls[0]
+    assert updated
+    assert "WHERE id = $2 AND locked_by = $3 AND status = 'processing'" in query
+    assert args == ('{"stage": "ocr"}', "job-1", DocumentJobQueue._worker_id)
+
+
+def test_update_locked_reports_a_lost_lock(monkeypatch):
+    stub_fetch_one(monkeypatch, lambda query, args: None)
+
+    assert not asyncio.run(DocumentJobQueue._update_locked('UPDATE document_jobs SET error = $1', "x", "job-1"))
+
+
+def test_enqueue_returns_the_active_job(monkeypatch):
+    def respond(query, args):
+        if "count(*)" in query:
+            return {"depth": 0}
+        if "WITH claimed" in query:
+            return None
+        return {"id": "job-1", "status": "processing"}
+
+    stub_fetch_one(monkeypatch, respond)
+
+    assert asyncio.run(DocumentJobQueue.enqueue("doc-1", "image/png")) == {"id": "job-1", "status": "processing"}
+
+
+def test_enqueue_refuses_a_document_claimed_by_a_batch(monkeypatch):
+    def respond(query, args):
+        if "count(*)" in query:
+            return {"depth": 0}
+        if "SELECT metadata" in query:
+            return {"metadata": json.dumps({"status": "processing"})}
+        return None
+
+    calls = stub_fetch_one(monkeypatch, respond)
+
+    with pytest.raises(JobConflictError):
+        asyncio.run(DocumentJobQueue.enqueue("doc-1", "image/png"))
+    assert sum("WITH claimed" in query for query, _ in calls) == 1
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.llm_cache import LLMCache
+
+PARAMS = {
+    "model": "gpt-4o-mini",
+    "messages": [{"role": "user", "content": "Summarize the incident."}],
+    "max_tokens": 500,
+    "temperature": 0.2,
+}
+
+
+def test_make_key_is_stable_and_ignores_other_params(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "openai")
+
+    reordered = dict(reversed(list(PARAMS.items())))
+    assert LLMCache.make_key(PARAMS) == LLMCache.make_key(reordered)
+    assert LLMCache.make_key(PARAMS) == LLMCache.make_key({**PARAMS, "timeout": 30})
+
+
+def test_make_key_changes_with_each_key_field(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "openai")
+    key = LLMCache.make_key(PARAMS)
+
+    assert LLMCache.make_key({**PARAMS, "model": "gpt-4o"}) != key
+    assert LLMCache.make_key({**PARAMS, "max_tokens": 501}) != key
+    assert LLMCache.make_key({**PARAMS, "response_format": {"type": "json_object"}}) != key
+    assert LLMCache.make_key({**PARAMS, "messages": [{"role": "user", "content": "Other."}]}) != key
+
+
+def test_make_key_separates_backends(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "openai")
+    real = LLMCache.make_key(PARAMS)
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+
+    assert LLMCache.make_key(PARAMS) != real
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import llm_scheduler
+from services.llm_scheduler import LLMScheduler, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def use_clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", clock)
+    return clock
+
+
+def reset_scheduler(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(LLMScheduler, "_queue", [])
+    monkeypatch.setattr(LLMScheduler, "_in_flight", 0)
+    monkeypatch.setattr(LLMScheduler, "_requests", None)
+    monkeypatch.setattr(LLMScheduler, "_tokens", None)
+    monkeypatch.setattr(LLMScheduler, "_paused_until", 0)
+    monkeypatch.setattr(LLMScheduler, "_timer", None)
+    monkeypatch.setattr(LLMScheduler, "_lane_stats", {})
+    monkeypatch.setattr(LLMScheduler, "_stats", {"rate_limited": 0, "retries": 0})
+
+
+def test_bucket_refills_at_its_rate(monkeypatch):
+    clock = use_clock(monkeypatch)
+    bucket = TokenBucket(rate=2, capacity=4)
+
+    bucket.consume(4)
+    assert bucket.time_until(1) == 0.5
+
+    clock.now += 1
+    assert bucket.time_until(2) == 0.0
+
+    clock.now += 10
+    bucket.time_until(0)
+    assert bucket.tokens == 4
+
+
+def test_oversized_request_waits_for_a_full_bucket(monkeypatch):
+    use_clock(monkeypatch)
+    bucket = TokenBucket(rate=10, capacity=100)
+    bucket.consume(50)
+
+    assert bucket.time_until(1000) == 5.0
+    bucket.consume(1000)
+    assert bucket.tokens == -50
+
+
+def test_interactive_callers_are_dispatched_before_batch(monkeypatch):
+    reset_scheduler(monkeypatch, LLM_MAX_CONCURRENCY="1")
+    order = []
+
+    async def call(name, priority):
+        await LLMScheduler.acquire(priority)
+        order.append(name)
+        await asyncio.sleep(0)
+        LLMScheduler.release()
+
+    async def scenario():
+        await LLMScheduler.acquire(LLMScheduler.INTERACTIVE)
+        waiters = [
+            asyncio.create_task(call("batch", LLMScheduler.BATCH)),
+            asyncio.create_task(call("interactive", LLMScheduler.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        LLMScheduler.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(scenario())
+    assert order == ["interactive", "batch"]
+
+
+def test_rate_limit_halves_the_request_rate_then_recovers(monkeypatch):
+    reset_scheduler(monkeypatch, LLM_REQUESTS_PER_MINUTE="600")
+
+    async def scenario():
+        await LLMScheduler.acquire()
+        LLMScheduler.release(rate_limited=True, retry_after=2)
+        assert LLMScheduler.stats()["requests_per_minute"] == 300
+        assert LLMScheduler.stats()["paused_for_seconds"] > 0
+
+        LLMScheduler._in_flight = 1
+        LLMScheduler.release()
+        assert LLMScheduler.stats()["requests_per_minute"] == 330
+
+    asyncio.run(scenario())
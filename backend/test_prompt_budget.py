@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.prompt_budget import PromptBudget, TokenCounter, TRUNCATION_MARKER
+
+
+def use_character_estimate():
+    # Deterministic counts: about 4 characters per token, no BPE download.
+    TokenCounter._loaded = True
+    TokenCounter._encoding = None
+
+
+def test_allocate_keeps_items_that_fit():
+    use_character_estimate()
+    statements = ["Alice: I saw the pump leaking.", "Bob: The valve was already open."]
+
+    budget = PromptBudget(2000)
+    budget.add_items("witnesses", statements, priority=1)
+    result = budget.allocate()
+
+    assert result["witnesses"] == "\n\n".join(statements)
+    assert TRUNCATION_MARKER not in result["witnesses"]
+
+
+def test_allocate_truncates_to_budget_and_cap():
+    use_character_estimate()
+    long_text = "word " * 400
+
+    budget = PromptBudget(100)
+    budget.add("description", long_text, priority=1, max_tokens=60)
+    budget.add_items("documents", [long_text, long_text], priority=2)
+    result = budget.allocate()
+
+    assert result["description"].endswith(TRUNCATION_MARKER)
+    assert budget.usage["description"] <= 60
+    assert budget.used_tokens <= 100
+    assert result["documents"].count(TRUNCATION_MARKER) == 2
+
+
+def test_allocate_fills_fields_in_priority_order():
+    use_character_estimate()
+
+    budget = PromptBudget(10)
+    budget.add("low", "x" * 400, priority=2)
+    budget.add("high", "y" * 20, priority=1)
+    result = budget.allocate()
+
+    assert result["high"] == "y" * 20
+    assert budget.usage["low"] <= 5
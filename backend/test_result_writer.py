@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import result_writer
+from services.result_writer import ResultWriter
+
+
+class StubConnection:
+    def __init__(self):
+        self.calls = []
+
+    async def fetchval(self, query, *args):
+        self.calls.append((query, args))
+        return "new-id"
+
+
+def test_query_numbers_result_audit_and_status_parameters():
+    query = ResultWriter._query("rca_reports", ("incident_id", "report_content"), ("status",))
+
+    assert "VALUES ($1, $2) RETURNING id" in query
+    assert "UPDATE incidents SET status = $9 WHERE id = $3" in query
+    assert "SELECT $3, $4, $5::jsonb || jsonb_build_object($7::text, inserted.id::text)" in query
+    # entity_id takes the id's own type, so uuid and integer ids both insert.
+    assert "$6, inserted.id, $8" in query
+
+
+def test_save_passes_values_then_audit_then_status(monkeypatch):
+    conn = StubConnection()
+
+    @asynccontextmanager
+    async def acquire():
+        yield conn
+
+    monkeypatch.setattr(result_writer.Database, "acquire", acquire)
+
+    new_id = asyncio.run(ResultWriter.save(
+        "ai_analysis",
+        {"incident_id": "inc-1", "findings": "{}"},
+        incident_id="inc-1",
+        action_type="FIRST_PASS_COMPLETED",
+        entity_type="ai_analysis",
+        id_key="analysis_id",
+        action_details={"model": "gpt-4o-mini"},
+        incident_updates={"investigation_status": "IN_REVIEW"},
+        performed_by="user-1",
+    ))
+
+    _, args = conn.calls[0]
+    assert new_id == "new-id"
+    assert args[:2] == ("inc-1", "{}")
+    assert args[2:5] == ("inc-1", "FIRST_PASS_COMPLETED", json.dumps({"model": "gpt-4o-mini"}))
+    assert args[5:] == ("ai_analysis", "analysis_id", "user-1", "IN_REVIEW")
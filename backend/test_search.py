@@ -0,0 +1,59 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from routers import search as search_router
+from services import search
+from services.search import SearchService
+
+
+def stub_rows(monkeypatch, rows):
+    calls = []
+
+    async def fetch_all(query, *args):
+        calls.append((query, args))
+        return rows
+
+    monkeypatch.setattr(search.Database, "fetch_all", fetch_all)
+    return calls
+
+
+def row(max_kind_total: int) -> dict:
+    return {
+        "kind": "document", "id": "doc-1", "incident_id": "inc-1", "title": "inspection.pdf",
+        "incident_title": "Scaffold collapse", "rank": 0.5, "snippet": "<mark>scaffold</mark>",
+        "total": 1, "max_kind_total": max_kind_total,
+    }
+
+
+def test_each_kind_is_capped_before_ranking(monkeypatch):
+    monkeypatch.setenv("SEARCH_MAX_CANDIDATES", "50")
+    calls = stub_rows(monkeypatch, [row(1)])
+
+    result = asyncio.run(SearchService.search("scaffold"))
+
+    query, args = calls[0]
+    assert query.count("LIMIT $6") == 2
+    assert args[5] == 50
+    assert result["total"] == 1
+    assert result["total_capped"] is False
+
+
+def test_total_is_flagged_as_capped_at_the_candidate_limit(monkeypatch):
+    monkeypatch.setenv("SEARCH_MAX_CANDIDATES", "50")
+    stub_rows(monkeypatch, [row(50)])
+
+    assert asyncio.run(SearchService.search("scaffold"))["total_capped"] is True
+
+
+def test_router_rejects_a_malformed_incident_id():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(search_router.search(
+            q="scaffold", page=1, page_size=20, kind=None, incident_id="not-a-uuid", current_user={}
+        ))
+    assert error.value.status_code == 400
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.similar_incidents import SimilarIncidentIndex, embed_text, _root_cause_texts
+
+DIM = 2048
+
+
+def build_index(monkeypatch, incidents):
+    monkeypatch.setenv("SIMILAR_INDEX_DIM", str(DIM))
+    for name in ("_ids", "_positions", "_titles", "_root_causes", "_matrix", "_df", "_norms"):
+        # _apply starts a fresh index when there is no matrix.
+        monkeypatch.setattr(SimilarIncidentIndex, name, None)
+    for incident_id, text in incidents.items():
+        SimilarIncidentIndex._apply(incident_id, incident_id, [], embed_text(text, DIM))
+
+
+def test_embed_text_drops_stop_words_and_counts_bigrams():
+    vector = embed_text("The pump and the valve", DIM)
+
+    assert vector.dtype == np.float32
+    assert np.count_nonzero(vector) <= 3
+    assert np.array_equal(vector, embed_text("pump valve", DIM))
+    assert not embed_text("the and of", DIM).any()
+
+
+def test_root_cause_texts_accepts_strings_objects_and_json():
+    assert _root_cause_texts('["Worn seal", {"cause": "No inspection"}]') == ["Worn seal", "No inspection"]
+    assert _root_cause_texts("Operator fatigue") == ["Operator fatigue"]
+    assert _root_cause_texts(None) == []
+
+
+def test_search_ranks_by_cosine_and_excludes_the_query(monkeypatch):
+    build_index(monkeypatch, {
+        "leak": "hydraulic pump seal leak in the compressor room",
+        "pump": "pump seal failure caused a hydraulic leak",
+        "fall": "worker fell from scaffolding during night shift",
+    })
+
+    query = embed_text("hydraulic pump seal leak in the compressor room", DIM)
+    matches = SimilarIncidentIndex._search(query, limit=3, exclude="leak")
+
+    assert matches[0]["incident_id"] == "pump"
+    assert 0 < matches[0]["score"] < 1
+    assert "leak" not in [match["incident_id"] for match in matches]
+
+    matches = SimilarIncidentIndex._search(query, limit=1, exclude=None)
+    assert matches[0]["incident_id"] == "leak"
+    assert matches[0]["score"] == 1.0
+
+
+def test_reindexing_replaces_the_vector(monkeypatch):
+    build_index(monkeypatch, {"a": "forklift collision in warehouse", "b": "chemical spill in laboratory"})
+
+    SimilarIncidentIndex._apply("a", "a", [], embed_text("chemical spill in laboratory", DIM))
+    matches = SimilarIncidentIndex._search(embed_text("chemical spill", DIM), limit=2, exclude=None)
+
+    assert len(SimilarIncidentIndex._ids) == 2
+    assert {match["incident_id"] for match in matches} == {"a", "b"}
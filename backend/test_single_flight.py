@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import single_flight
+from utils.single_flight import SingleFlight
+
+
+class FakeLeaseStore:
+    """In-memory stand-in for the single_flight_leases table."""
+
+    def __init__(self):
+        self.leases = {}
+
+    async def fetch_one(self, query, key, holder, ttl):
+        if key in self.leases:
+            return None
+        self.leases[key] = holder
+        return {"holder": holder}
+
+    async def execute(self, query, key, holder, *args):
+        if query.lstrip().startswith("DELETE") and self.leases.get(key) == holder:
+            del self.leases[key]
+
+
+def use_store(monkeypatch) -> FakeLeaseStore:
+    store = FakeLeaseStore()
+    monkeypatch.setattr(single_flight.Database, "fetch_one", store.fetch_one)
+    monkeypatch.setattr(single_flight.Database, "execute", store.execute)
+    monkeypatch.setattr(SingleFlight, "_in_flight", {})
+    monkeypatch.setattr(SingleFlight, "_stats", {"leaders": 0, "coalesced": 0, "lock_waits_ms": 0.0, "lock_timeouts": 0})
+    return store
+
+
+def test_concurrent_callers_share_one_computation(monkeypatch):
+    store = use_store(monkeypatch)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "report"
+
+    async def scenario():
+        return await asyncio.gather(*[SingleFlight.run("report:1", compute) for _ in range(3)])
+
+    assert asyncio.run(scenario()) == ["report"] * 3
+    assert len(calls) == 1
+    assert SingleFlight.stats()["coalesced"] == 2
+    assert store.leases == {}
+
+
+def test_waits_for_a_lease_held_by_another_worker(monkeypatch):
+    store = use_store(monkeypatch)
+    store.leases["report:1"] = "other-worker"
+    order = []
+
+    async def compute():
+        order.append("computed")
+        return "report"
+
+    async def release():
+        await asyncio.sleep(0.1)
+        order.append("released")
+        del store.leases["report:1"]
+
+    async def scenario():
+        result, _ = await asyncio.gather(SingleFlight.run("report:1", compute), release())
+        return result
+
+    assert asyncio.run(scenario()) == "report"
+    assert order == ["released", "computed"]
+    assert store.leases == {}
+
+
+def test_runs_without_the_lease_after_the_wait_timeout(monkeypatch):
+    store = use_store(monkeypatch)
+    store.leases["report:1"] = "stuck-worker"
+    monkeypatch.setenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "0.1")
+
+    async def compute():
+        return "report"
+
+    assert asyncio.run(SingleFlight.run("report:1", compute)) == "report"
+    assert SingleFlight.stats()["lock_timeouts"] == 1
+    assert store.leases == {"report:1": "stuck-worker"}
@@ -0,0 +1,387 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+import httpx
+from minio.credentials import Credentials
+from minio.signer import presign_v4, sign_v4_s3
+
+from utils.storage import DOWNLOAD_CHUNK_SIZE, MIN_PART_SIZE, SpooledDownload, spool_max_bytes
+
+S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+
+class StorageError(Exception):
+    pass
+
+
+class S3Backend:
+    """Minimal S3 client for MinIO on a pooled httpx.AsyncClient.
+
+    Requests are signed with minio's own SigV4 signer, so credentials and
+    endpoint settings match the synchronous StorageClient.
+    """
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, secure: bool, region: str, bucket: str):
+        self.base_url = f"{'https' if secure else 'http'}://{endpoint}"
+        self.host = endpoint
+        self.region = region
+        self.bucket = bucket
+        self.credentials = Credentials(access_key, secret_key)
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("STORAGE_MAX_CONNECTIONS", 32)),
+                max_keepalive_connections=int(os.getenv("STORAGE_MAX_KEEPALIVE", 16)),
+                keepalive_expiry=float(os.getenv("STORAGE_KEEPALIVE_EXPIRY", 30)),
+            ),
+            timeout=httpx.Timeout(
+                float(os.getenv("STORAGE_TIMEOUT", 60)),
+                connect=float(os.getenv("STORAGE_CONNECT_TIMEOUT", 5)),
+            ),
+        )
+
+    def _url(self, key: Optional[str] = None, query: str = ""):
+        path = f"/{self.bucket}" + (f"/{quote(key, safe='/~')}" if key else "")
+        return urlsplit(f"{self.base_url}{path}" + (f"?{query}" if query else ""))
+
+    def _signed_headers(self, method: str, url, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        date = datetime.now(timezone.utc)
+        headers = dict(headers or {})
+        headers["Host"] = self.host
+        headers["x-amz-date"] = date.strftime("%Y%m%dT%H%M%SZ")
+        headers["x-amz-content-sha256"] = UNSIGNED_PAYLOAD
+        return sign_v4_s3(method, url, self.region, headers, self.credentials, UNSIGNED_PAYLOAD, date)
+
+    async def _request(self, method: str, key: Optional[str] = None, query: str = "", content=None, headers=None) -> httpx.Response:
+        url = self._url(key, query)
+        response = await self.http.request(
+            method, url.geturl(), content=content, headers=self._signed_headers(method, url, headers)
+        )
+        if response.status_code >= 300:
+            raise StorageError(f"{method} {url.path} failed with {response.status_code}: {response.text[:200]}")
+        return response
+
+    async def ensure_bucket(self):
+        url = self._url()
+        response = await self.http.head(url.geturl(), headers=self._signed_headers("HEAD", url))
+        if response.status_code == 404:
+            await self._request("PUT")
+        elif response.status_code >= 300:
+            raise StorageError(f"Bucket check failed with {response.status_code}")
+
+    async def put_object(self, key: str, data: bytes, content_type: str):
+        await self._request("PUT", key, content=data, headers={"Content-Type": content_type})
+
+    @asynccontextmanager
+    async def get_object(self, key: str) -> AsyncIterator[Tuple[int, AsyncIterator[bytes]]]:
+        url = self._url(key)
+        request = self.http.build_request("GET", url.geturl(), headers=self._signed_headers("GET", url))
+        response = await self.http.send(request, stream=True)
+        try:
+            if response.status_code >= 300:
+                await response.aread()
+                raise StorageError(f"GET {url.path} failed with {response.status_code}: {response.text[:200]}")
+            yield int(response.headers.get("Content-Length") or 0), response.aiter_bytes(DOWNLOAD_CHUNK_SIZE)
+        finally:
+            await response.aclose()
+
+    async def head_object(self, key: str) -> Optional[str]:
+        """The object's ETag, or None if it does not exist."""
+        url = self._url(key)
+        response = await self.http.head(url.geturl(), headers=self._signed_headers("HEAD", url))
+        if response.status_code == 404:
+            return None
+        if response.status_code >= 300:
+            raise StorageError(f"HEAD {url.path} failed with {response.status_code}")
+        return response.headers.get("ETag")
+
+    async def delete_object(self, key: str):
+        await self._request("DELETE", key)
+
+    async def create_multipart_upload(self, key: str, content_type: str) -> str:
+        response = await self._request("POST", key, query="uploads=", headers={"Content-Type": content_type})
+        return ET.fromstring(response.content).find(f"{S3_NAMESPACE}UploadId").text
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        query = f"partNumber={part_number}&uploadId={quote(upload_id, safe='')}"
+        response = await self._request("PUT", key, query=query, content=data)
+        return response.headers["ETag"]
+
+    async def complete_multipart_upload(self, key: str, upload_id: str, etags):
+        parts = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in enumerate(etags, 1)
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode()
+        await self._request("POST", key, query=f"uploadId={quote(upload_id, safe='')}", content=body)
+
+    async def abort_multipart_upload(self, key: str, upload_id: str):
+        await self._request("DELETE", key, query=f"uploadId={quote(upload_id, safe='')}")
+
+    def presigned_get_url(self, key: str, expires: int) -> str:
+        return presign_v4(
+            "GET", self._url(key), self.region, self.credentials, datetime.now(timezone.utc), expires
+        ).geturl()
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class InMemoryBackend:
+    """Process-local stand-in for S3, selected with STORAGE_BACKEND=memory."""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self.objects: Dict[str, Tuple[bytes, str]] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+
+    async def ensure_bucket(self):
+        pass
+
+    async def put_object(self, key: str, data: bytes, content_type: str):
+        self.objects[key] = (bytes(data), content_type)
+
+    @asynccontextmanager
+    async def get_object(self, key: str):
+        if key not in self.objects:
+            raise StorageError(f"GET /{self.bucket}/{key} failed with 404")
+        data = self.objects[key][0]
+
+        async def chunks():
+            for offset in range(0, len(data), DOWNLOAD_CHUNK_SIZE):
+                yield data[offset:offset + DOWNLOAD_CHUNK_SIZE]
+
+        yield len(data), chunks()
+
+    async def head_object(self, key: str) -> Optional[str]:
+        if key not in self.objects:
+            return None
+        return hashlib.md5(self.objects[key][0]).hexdigest()
+
+    async def delete_object(self, key: str):
+        self.objects.pop(key, None)
+
+    async def create_multipart_upload(self, key: str, content_type: str) -> str:
+        upload_id = hashlib.sha1(f"{key}{time.time_ns()}".encode()).hexdigest()
+        self.uploads[upload_id] = {}
+        return upload_id
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        self.uploads[upload_id][part_number] = bytes(data)
+        return hashlib.md5(data).hexdigest()
+
+    async def complete_multipart_upload(self, key: str, upload_id: str, etags):
+        parts = self.uploads.pop(upload_id)
+        self.objects[key] = (b"".join(parts[n] for n in sorted(parts)), "application/octet-stream")
+
+    async def abort_multipart_upload(self, key: str, upload_id: str):
+        self.uploads.pop(upload_id, None)
+
+    def presigned_get_url(self, key: str, expires: int) -> str:
+        return f"memory://{self.bucket}/{key}"
+
+    async def close(self):
+        pass
+
+
+class AsyncStorageClient:
+    """Async counterpart of StorageClient with the same method names.
+
+    All operations share one pooled HTTP client, are capped by
+    STORAGE_MAX_CONCURRENCY and record per-operation timings.
+    """
+
+    _backend = None
+    _bucket_name = "rca-documents"
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _lock: Optional[asyncio.Lock] = None
+    _timings: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    async def get_client(cls):
+        if cls._backend is None:
+            if cls._lock is None:
+                cls._lock = asyncio.Lock()
+            async with cls._lock:
+                if cls._backend is None:
+                    cls._semaphore = asyncio.Semaphore(int(os.getenv("STORAGE_MAX_CONCURRENCY", 16)))
+
+                    if os.getenv("STORAGE_BACKEND", "minio").lower() == "memory":
+                        backend = InMemoryBackend(cls._bucket_name)
+                    else:
+                        backend = S3Backend(
+                            os.getenv("MINIO_ENDPOINT", "localhost:9000"),
+                            os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+                            os.getenv("MINIO_SECRET_KEY", "minioadmin123"),
+                            os.getenv("MINIO_SECURE", "false").lower() == "true",
+                            os.getenv("MINIO_REGION", "us-east-1"),
+                            cls._bucket_name,
+                        )
+
+                    try:
+                        await backend.ensure_bucket()
+                    except (StorageError, httpx.HTTPError) as e:
+                        print(f"Error creating bucket: {e}")
+
+                    cls._backend = backend
+        return cls._backend
+
+    @classmethod
+    async def close(cls):
+        if cls._backend is not None:
+            await cls._backend.close()
+            cls._backend = None
+
+    @classmethod
+    @asynccontextmanager
+    async def _operation(cls, name: str):
+        backend = await cls.get_client()
+        timing = cls._timings.setdefault(name, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+        async with cls._semaphore:
+            started = time.perf_counter()
+            try:
+                yield backend
+            except Exception:
+                timing["errors"] += 1
+                raise
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                timing["count"] += 1
+                timing["total_ms"] += elapsed
+                timing["max_ms"] = max(timing["max_ms"], elapsed)
+
+    @classmethod
+    async def upload_file(cls, file_data: bytes, file_path: str, content_type: str = "application/octet-stream") -> str:
+        try:
+            async with cls._operation("upload_file") as backend:
+                await backend.put_object(file_path, file_data, content_type)
+            return file_path
+        except (StorageError, httpx.HTTPError) as e:
+            raise Exception(f"Failed to upload file: {str(e)}")
+
+    @classmethod
+    async def download_file(cls, file_path: str) -> bytes:
+        try:
+            async with cls._operation("download_file") as backend:
+                async with backend.get_object(file_path) as (_, chunks):
+                    return b"".join([chunk async for chunk in chunks])
+        except (StorageError, httpx.HTTPError) as e:
+            raise Exception(f"Failed to download file: {str(e)}")
+
+    @classmethod
+    async def get_etag(cls, file_path: str) -> Optional[str]:
+        """The object's current ETag; None if it is missing or storage is unreachable."""
+        try:
+            async with cls._operation("get_etag") as backend:
+                return await backend.head_object(file_path)
+        except (StorageError, httpx.HTTPError) as e:
+            print(f"Could not stat {file_path}: {e}")
+            return None
+
+    @classmethod
+    async def download_spooled(cls, file_path: str, max_in_memory: Optional[int] = None) -> SpooledDownload:
+        max_in_memory = spool_max_bytes() if max_in_memory is None else max_in_memory
+        temp_file = None
+
+        try:
+            async with cls._operation("download_spooled") as backend:
+                async with backend.get_object(file_path) as (content_length, chunks):
+                    chunk_list = []
+                    size = 0
+
+                    if content_length > max_in_memory:
+                        temp_file = tempfile.NamedTemporaryFile(prefix="rca-", delete=False)
+
+                    async for chunk in chunks:
+                        size += len(chunk)
+                        if temp_file is None and size > max_in_memory:
+                            temp_file = tempfile.NamedTemporaryFile(prefix="rca-", delete=False)
+                            await asyncio.to_thread(temp_file.write, b"".join(chunk_list))
+                            chunk_list = []
+                        if temp_file is not None:
+                            await asyncio.to_thread(temp_file.write, chunk)
+                        else:
+                            chunk_list.append(chunk)
+
+            if temp_file is not None:
+                temp_file.close()
+                return SpooledDownload(path=temp_file.name, size=size)
+            return SpooledDownload(data=b"".join(chunk_list), size=size)
+        except Exception as e:
+            if temp_file is not None:
+                temp_file.close()
+                os.unlink(temp_file.name)
+            if isinstance(e, (StorageError, httpx.HTTPError)):
+                raise Exception(f"Failed to download file: {str(e)}")
+            raise
+
+    @classmethod
+    async def upload_stream(
+        cls,
+        chunks: AsyncIterator[bytes],
+        file_path: str,
+        content_type: str = "application/octet-stream",
+        part_size: Optional[int] = None
+    ) -> str:
+        part_size = part_size or max(MIN_PART_SIZE, int(os.getenv("STORAGE_PART_SIZE", 8 * 1024 * 1024)))
+
+        try:
+            async with cls._operation("upload_stream") as backend:
+                upload_id = await backend.create_multipart_upload(file_path, content_type)
+                etags = []
+                buffer = bytearray()
+
+                try:
+                    async for chunk in chunks:
+                        buffer.extend(chunk)
+                        while len(buffer) >= part_size:
+                            etags.append(await backend.upload_part(
+                                file_path, upload_id, len(etags) + 1, bytes(buffer[:part_size])
+                            ))
+                            del buffer[:part_size]
+
+                    if buffer or not etags:
+                        etags.append(await backend.upload_part(file_path, upload_id, len(etags) + 1, bytes(buffer)))
+                    await backend.complete_multipart_upload(file_path, upload_id, etags)
+                except BaseException:
+                    await backend.abort_multipart_upload(file_path, upload_id)
+                    raise
+            return file_path
+        except (StorageError, httpx.HTTPError) as e:
+            raise Exception(f"Failed to upload file: {str(e)}")
+
+    @classmethod
+    async def delete_file(cls, file_path: str):
+        try:
+            async with cls._operation("delete_file") as backend:
+                await backend.delete_object(file_path)
+        except (StorageError, httpx.HTTPError) as e:
+            raise Exception(f"Failed to delete file: {str(e)}")
+
+    @classmethod
+    async def get_file_url(cls, file_path: str, expires_in_seconds: int = 3600) -> str:
+        # Presigning is local computation; no round trip to MinIO.
+        backend = await cls.get_client()
+        return backend.presigned_get_url(file_path, expires_in_seconds)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "backend": type(cls._backend).__name__ if cls._backend else None,
+            "operations": {
+                name: {
+                    **timing,
+                    "avg_ms": round(timing["total_ms"] / timing["count"], 2) if timing["count"] else 0.0,
+                }
+                for name, timing in cls._timings.items()
+            },
+        }
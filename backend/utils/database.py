@@ -1,23 +1,73 @@
+import asyncio
 import asyncpg
 import os
+import time
+from contextlib import asynccontextmanager
 from typing import Optional
 
 class Database:
+    """The process-wide asyncpg pool, shared by every router and service.
+
+    Sizing and statement caching come from the environment (``DB_POOL_*``,
+    ``DB_STATEMENT_CACHE_SIZE``); size Postgres ``max_connections`` for
+    workers x ``DB_POOL_MAX_SIZE``. ``stats()`` reports how long callers wait
+    for a connection, how many are checked out and how long queries take.
+    """
+
     _pool: Optional[asyncpg.Pool] = None
+    _connect_lock: Optional[asyncio.Lock] = None
+    _acquire_stats = {"count": 0, "timeouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0, "in_use": 0, "max_in_use": 0}
+    _query_stats = {}
+
+    @staticmethod
+    def max_size() -> int:
+        return int(os.getenv("DB_POOL_MAX_SIZE", 20))
+
+    @staticmethod
+    def _record_query(record):
+        words = record.query.lstrip().split(None, 1)
+        kind = words[0].upper() if words else "OTHER"
+        if kind not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY"):
+            kind = "OTHER"
+
+        elapsed_ms = record.elapsed * 1000
+        timing = Database._query_stats.setdefault(
+            kind, {"count": 0, "errors": 0, "slow": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        timing["count"] += 1
+        timing["total_ms"] += elapsed_ms
+        timing["max_ms"] = max(timing["max_ms"], elapsed_ms)
+        if record.exception is not None:
+            timing["errors"] += 1
+        if elapsed_ms >= float(os.getenv("DB_SLOW_QUERY_MS", 500)):
+            timing["slow"] += 1
+
+    @staticmethod
+    async def _init_connection(conn):
+        conn.add_query_logger(Database._record_query)
 
     @classmethod
     async def connect(cls):
         if cls._pool is None:
-            database_url = os.getenv("DATABASE_URL")
-            if not database_url:
-                raise ValueError("DATABASE_URL environment variable is not set")
-
-            cls._pool = await asyncpg.create_pool(
-                database_url,
-                min_size=5,
-                max_size=20,
-                command_timeout=60
-            )
+            if cls._connect_lock is None:
+                cls._connect_lock = asyncio.Lock()
+            async with cls._connect_lock:
+                if cls._pool is None:
+                    database_url = os.getenv("DATABASE_URL")
+                    if not database_url:
+                        raise ValueError("DATABASE_URL environment variable is not set")
+
+                    cls._pool = await asyncpg.create_pool(
+                        database_url,
+                        min_size=int(os.getenv("DB_POOL_MIN_SIZE", 5)),
+                        max_size=cls.max_size(),
+                        max_inactive_connection_lifetime=float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", 300)),
+                        command_timeout=float(os.getenv("DB_COMMAND_TIMEOUT", 60)),
+                        # Set to 0 behind PgBouncer in transaction mode.
+                        statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+                        max_cached_statement_lifetime=int(os.getenv("DB_STATEMENT_CACHE_LIFETIME", 300)),
+                        init=cls._init_connection
+                    )
         return cls._pool
 
     @classmethod
@@ -26,6 +76,30 @@ class Database:
             await cls._pool.close()
             cls._pool = None
 
+    @classmethod
+    @asynccontextmanager
+    async def acquire(cls):
+        """Check out a connection, recording the wait and the number in use."""
+        pool = await cls.connect()
+        stats = cls._acquire_stats
+        started = time.perf_counter()
+        try:
+            conn = await pool.acquire(timeout=float(os.getenv("DB_ACQUIRE_TIMEOUT", 30)))
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            raise
+        waited_ms = (time.perf_counter() - started) * 1000
+        stats["count"] += 1
+        stats["total_wait_ms"] += waited_ms
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], waited_ms)
+        stats["in_use"] += 1
+        stats["max_in_use"] = max(stats["max_in_use"], stats["in_use"])
+        try:
+            yield conn
+        finally:
+            stats["in_use"] -= 1
+            await pool.release(conn)
+
     @classmethod
     async def get_connection(cls):
         pool = await cls.connect()
@@ -38,24 +112,49 @@ class Database:
 
     @classmethod
     async def fetch_one(cls, query: str, *args):
-        pool = await cls.connect()
-        async with pool.acquire() as conn:
+        async with cls.acquire() as conn:
             return await conn.fetchrow(query, *args)
 
     @classmethod
     async def fetch_all(cls, query: str, *args):
-        pool = await cls.connect()
-        async with pool.acquire() as conn:
+        async with cls.acquire() as conn:
             return await conn.fetch(query, *args)
 
     @classmethod
     async def execute(cls, query: str, *args):
-        pool = await cls.connect()
-        async with pool.acquire() as conn:
+        async with cls.acquire() as conn:
             return await conn.execute(query, *args)
 
     @classmethod
     async def execute_many(cls, query: str, args_list):
-        pool = await cls.connect()
-        async with pool.acquire() as conn:
+        async with cls.acquire() as conn:
             return await conn.executemany(query, args_list)
+
+    @classmethod
+    def stats(cls) -> dict:
+        pool = cls._pool
+        acquires = cls._acquire_stats
+        return {
+            "pool": {
+                "size": pool.get_size() if pool else 0,
+                "idle": pool.get_idle_size() if pool else 0,
+                "min_size": pool.get_min_size() if pool else int(os.getenv("DB_POOL_MIN_SIZE", 5)),
+                "max_size": pool.get_max_size() if pool else cls.max_size(),
+                "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+            },
+            "acquire": {
+                **acquires,
+                "total_wait_ms": round(acquires["total_wait_ms"], 2),
+                "max_wait_ms": round(acquires["max_wait_ms"], 2),
+                "avg_wait_ms": round(acquires["total_wait_ms"] / acquires["count"], 2) if acquires["count"] else 0.0,
+            },
+            "queries": {
+                kind: {
+                    **timing,
+                    "total_ms": round(timing["total_ms"], 2),
+                    "max_ms": round(timing["max_ms"], 2),
+                    "avg_ms": round(timing["total_ms"] / timing["count"], 2) if timing["count"] else 0.0,
+                }
+                for kind, timing in cls._query_stats.items()
+            },
+        }
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+
+from utils.database import Database
+
+ACQUIRE_QUERY = '''
+INSERT INTO single_flight_leases (lease_key, holder, expires_at)
+VALUES ($1, $2, now() + make_interval(secs => $3))
+ON CONFLICT (lease_key) DO UPDATE SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+WHERE single_flight_leases.expires_at < now()
+RETURNING holder
+'''
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that would compute the same thing.
+
+    Within a process, callers that arrive while a computation for ``key`` is
+    running await that computation instead of starting their own. Across
+    workers the computation runs under a lease row in
+    ``single_flight_leases``, so a second worker polls (with backoff) until
+    the first finishes; the computation itself should then pick up the row
+    the first worker wrote rather than producing a new one.
+
+    No connection is held while the computation runs. The leader extends its
+    lease every SINGLE_FLIGHT_LEASE_TTL / 3 seconds, so a dead worker's lease
+    expires on its own. A waiter that has not got the lease after
+    SINGLE_FLIGHT_WAIT_TIMEOUT seconds runs the computation anyway.
+    """
+
+    _in_flight: Dict[str, asyncio.Future] = {}
+    _stats = {"leaders": 0, "coalesced": 0, "lock_waits_ms": 0.0, "lock_timeouts": 0}
+
+    @staticmethod
+    def _lease_ttl() -> float:
+        return float(os.getenv("SINGLE_FLIGHT_LEASE_TTL", 120))
+
+    @classmethod
+    async def _acquire_lease(cls, key: str, holder: str) -> bool:
+        deadline = asyncio.get_running_loop().time() + float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", 600))
+        delay = 0.05
+        while True:
+            if await Database.fetch_one(ACQUIRE_QUERY, key, holder, cls._lease_ttl()) is not None:
+                return True
+            if asyncio.get_running_loop().time() >= deadline:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    @classmethod
+    async def _keep_lease(cls, key: str, holder: str):
+        while True:
+            await asyncio.sleep(cls._lease_ttl() / 3)
+            try:
+                await Database.execute(
+                    '''UPDATE single_flight_leases SET expires_at = now() + make_interval(secs => $3)
+                       WHERE lease_key = $1 AND holder = $2''',
+                    key, holder, cls._lease_ttl()
+                )
+            except Exception as e:
+                print(f"Error extending single-flight lease {key}: {e}")
+
+    @classmethod
+    async def _run_locked(cls, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        holder = f"{os.getpid()}-{uuid.uuid4().hex}"
+
+        started = asyncio.get_running_loop().time()
+        acquired = await cls._acquire_lease(key, holder)
+        cls._stats["lock_waits_ms"] += (asyncio.get_running_loop().time() - started) * 1000
+        if not acquired:
+            cls._stats["lock_timeouts"] += 1
+            print(f"Timed out waiting for single-flight lease {key}; running without it")
+            return await func()
+
+        keeper = asyncio.create_task(cls._keep_lease(key, holder))
+        try:
+            return await func()
+        finally:
+            keeper.cancel()
+            await asyncio.gather(keeper, return_exceptions=True)
+            try:
+                await Database.execute(
+                    'DELETE FROM single_flight_leases WHERE lease_key = $1 AND holder = $2',
+                    key, holder
+                )
+            except Exception as e:
+                print(f"Error releasing single-flight lease {key}: {e}")
+
+    @classmethod
+    def _finished(cls, key: str, task: asyncio.Future):
+        cls._in_flight.pop(key, None)
+        # Mark the exception as retrieved even if every caller went away.
+        if not task.cancelled():
+            task.exception()
+
+    @classmethod
+    async def run(cls, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        existing = cls._in_flight.get(key)
+        if existing is not None:
+            cls._stats["coalesced"] += 1
+            return await asyncio.shield(existing)
+
+        cls._stats["leaders"] += 1
+        task = asyncio.ensure_future(cls._run_locked(key, func))
+        cls._in_flight[key] = task
+        task.add_done_callback(lambda done: cls._finished(key, done))
+        # Shielded so a caller that disconnects does not cancel the work the
+        # other callers are waiting on.
+        return await asyncio.shield(task)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "in_flight": len(cls._in_flight),
+            "leaders": cls._stats["leaders"],
+            "coalesced": cls._stats["coalesced"],
+            "lock_waits_ms": round(cls._stats["lock_waits_ms"], 2),
+            "lock_timeouts": cls._stats["lock_timeouts"],
+        }
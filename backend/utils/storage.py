@@ -1,9 +1,112 @@
 import os
+import asyncio
+import hashlib
+import mmap
+import tempfile
 from minio import Minio
 from minio.error import S3Error
-from typing import BinaryIO, Optional
+from typing import AsyncIterator, BinaryIO, Optional, Union
 import io
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def spool_max_bytes() -> int:
+    return int(os.getenv("STORAGE_SPOOL_MAX_BYTES", 16 * 1024 * 1024))
+
+
+class SpooledDownload:
+    """A downloaded object held in memory below the spool cap, on disk above it.
+
+    ``source`` is what the extractors take: the bytes themselves, or the path
+    of the temp file, which is cheap to hand to a worker process.
+    """
+
+    def __init__(self, data: Optional[bytes] = None, path: Optional[str] = None, size: int = 0):
+        self.data = data
+        self.path = path
+        self.size = size
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        return self.data if self.path is None else self.path
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def read_bytes(self) -> bytes:
+        if self.path is None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def sha256(self) -> str:
+        if self.path is None:
+            return hashlib.sha256(self.data).hexdigest()
+        if self.size == 0:
+            return hashlib.sha256(b"").hexdigest()
+        # Hash through a read-only mapping so the file is paged in by the
+        # kernel instead of being copied onto the heap.
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+    def cleanup(self):
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+class _AsyncIteratorReader(io.RawIOBase):
+    """Blocking file-like view over an async iterator of chunks.
+
+    MinIO's put_object runs in a worker thread and pulls data with read();
+    each read schedules the next chunk on the event loop that owns the iterator.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks
+        self._loop = loop
+        self._buffer = b""
+        self._exhausted = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_chunk(self) -> Optional[bytes]:
+        async def fetch():
+            try:
+                return await self._chunks.__anext__()
+            except StopAsyncIteration:
+                return None
+        return asyncio.run_coroutine_threadsafe(fetch(), self._loop).result()
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._exhausted and (size < 0 or len(self._buffer) < size):
+            chunk = self._next_chunk()
+            if chunk is None:
+                self._exhausted = True
+            else:
+                self._buffer += chunk
+
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
 class StorageClient:
     _client: Optional[Minio] = None
     _bucket_name = "rca-documents"
@@ -61,6 +164,91 @@ class StorageClient:
         except S3Error as e:
             raise Exception(f"Failed to download file: {str(e)}")
 
+    @classmethod
+    def download_spooled(cls, file_path: str, max_in_memory: Optional[int] = None) -> SpooledDownload:
+        """Stream an object in chunks, spilling to a temp file above the spool cap."""
+        client = cls.get_client()
+        max_in_memory = spool_max_bytes() if max_in_memory is None else max_in_memory
+        response = None
+        temp_file = None
+
+        try:
+            response = client.get_object(cls._bucket_name, file_path)
+            content_length = int(response.headers.get("Content-Length") or 0)
+            buffer = io.BytesIO()
+            size = 0
+
+            if content_length > max_in_memory:
+                temp_file = tempfile.NamedTemporaryFile(prefix="rca-", delete=False)
+
+            for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if temp_file is None and size > max_in_memory:
+                    temp_file = tempfile.NamedTemporaryFile(prefix="rca-", delete=False)
+                    temp_file.write(buffer.getvalue())
+                    buffer = None
+                if temp_file is not None:
+                    temp_file.write(chunk)
+                else:
+                    buffer.write(chunk)
+
+            if temp_file is not None:
+                temp_file.close()
+                return SpooledDownload(path=temp_file.name, size=size)
+            return SpooledDownload(data=buffer.getvalue(), size=size)
+        except Exception as e:
+            if temp_file is not None:
+                temp_file.close()
+                os.unlink(temp_file.name)
+            if isinstance(e, S3Error):
+                raise Exception(f"Failed to download file: {str(e)}")
+            raise
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    @classmethod
+    def upload_fileobj(
+        cls,
+        file_obj: BinaryIO,
+        file_path: str,
+        content_type: str = "application/octet-stream",
+        length: int = -1,
+        part_size: Optional[int] = None
+    ) -> str:
+        """Multipart upload from a file-like object without buffering it whole."""
+        client = cls.get_client()
+        part_size = part_size or max(MIN_PART_SIZE, int(os.getenv("STORAGE_PART_SIZE", 8 * 1024 * 1024)))
+
+        try:
+            client.put_object(
+                cls._bucket_name,
+                file_path,
+                file_obj,
+                length=length,
+                content_type=content_type,
+                part_size=part_size,
+                # One part in flight keeps memory at roughly part_size per upload.
+                num_parallel_uploads=1
+            )
+            return file_path
+        except S3Error as e:
+            raise Exception(f"Failed to upload file: {str(e)}")
+
+    @classmethod
+    async def upload_stream(
+        cls,
+        chunks: AsyncIterator[bytes],
+        file_path: str,
+        content_type: str = "application/octet-stream",
+        part_size: Optional[int] = None
+    ) -> str:
+        reader = _AsyncIteratorReader(chunks, asyncio.get_running_loop())
+        return await asyncio.to_thread(
+            cls.upload_fileobj, reader, file_path, content_type, -1, part_size
+        )
+
     @classmethod
     def delete_file(cls, file_path: str):
         client = cls.get_client()
@@ -45,6 +45,87 @@ CREATE TABLE IF NOT EXISTS documents (
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- Extraction cache (OCR text / AI descriptions keyed by SHA-256 of file bytes)
+CREATE TABLE IF NOT EXISTS extraction_cache (
+  content_hash TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  content TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (content_hash, kind)
+);
+
+-- Chat completion responses keyed by a hash of the request parameters
+CREATE TABLE IF NOT EXISTS llm_cache (
+  cache_key TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  content TEXT NOT NULL,
+  prompt_tokens INTEGER DEFAULT 0,
+  completion_tokens INTEGER DEFAULT 0,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache(expires_at);
+
+-- Cross-worker leases for coalesced analysis requests (see SingleFlight)
+CREATE TABLE IF NOT EXISTS single_flight_leases (
+  lease_key TEXT PRIMARY KEY,
+  holder TEXT NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Map-reduce digests of extracted document text, keyed by a hash of their source
+CREATE TABLE IF NOT EXISTS document_digests (
+  document_id UUID PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+  incident_id UUID NOT NULL REFERENCES incidents(id) ON DELETE CASCADE,
+  source_hash TEXT NOT NULL,
+  digest TEXT NOT NULL,
+  chunk_count INTEGER NOT NULL DEFAULT 1,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS incident_digests (
+  incident_id UUID PRIMARY KEY REFERENCES incidents(id) ON DELETE CASCADE,
+  source_hash TEXT NOT NULL,
+  digest TEXT NOT NULL,
+  document_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Hashed TF vectors for the similar-incident index (float32 bytes of length dim)
+CREATE TABLE IF NOT EXISTS incident_vectors (
+  incident_id UUID PRIMARY KEY REFERENCES incidents(id) ON DELETE CASCADE,
+  title TEXT NOT NULL DEFAULT '',
+  root_causes JSONB DEFAULT '[]',
+  vector BYTEA NOT NULL,
+  dim INTEGER NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_incident_vectors_updated_at ON incident_vectors(updated_at);
+
+-- Document processing jobs (claimed by workers with FOR UPDATE SKIP LOCKED)
+CREATE TABLE IF NOT EXISTS document_jobs (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  file_type TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'processing', 'completed', 'failed')),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 3,
+  progress JSONB DEFAULT '{}',
+  result JSONB,
+  error TEXT,
+  run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+  locked_by TEXT,
+  locked_at TIMESTAMPTZ,
+  created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  started_at TIMESTAMPTZ,
+  finished_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
 -- AI Analysis table
 CREATE TABLE IF NOT EXISTS ai_analysis (
   id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -83,6 +164,20 @@ CREATE TABLE IF NOT EXISTS human_reviews (
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- Full-text search vectors, kept up to date by Postgres whenever a row's text changes.
+-- Document text is capped so one huge PDF cannot exceed the 1 MB tsvector limit.
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce(filename, '')), 'A') ||
+  setweight(to_tsvector('english', CASE WHEN extracted_text = 'processing' THEN '' ELSE left(coalesce(extracted_text, ''), 500000) END), 'B') ||
+  setweight(to_tsvector('english', coalesce(metadata->>'ai_description', '')), 'C')
+) STORED;
+
+ALTER TABLE incidents ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+  setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+  setweight(to_tsvector('english', coalesce(impact_description, '')), 'C')
+) STORED;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_incidents_user_id ON incidents(user_id);
 CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents(status);
@@ -91,6 +186,12 @@ CREATE INDEX IF NOT EXISTS idx_incidents_occurred_at ON incidents(occurred_at);
 
 CREATE INDEX IF NOT EXISTS idx_documents_incident_id ON documents(incident_id);
 CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id);
+CREATE INDEX IF NOT EXISTS idx_documents_search_vector ON documents USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_incidents_search_vector ON incidents USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_document_jobs_queued ON document_jobs(created_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_document_jobs_processing ON document_jobs(locked_at) WHERE status = 'processing';
+CREATE UNIQUE INDEX IF NOT EXISTS idx_document_jobs_active_document ON document_jobs(document_id) WHERE status IN ('queued', 'processing');
 
 CREATE INDEX IF NOT EXISTS idx_ai_analysis_incident_id ON ai_analysis(incident_id);
 CREATE INDEX IF NOT EXISTS idx_ai_analysis_user_id ON ai_analysis(user_id);